@@ -1,5 +1,15 @@
+import argparse
+import os
+import sys
+
+import numpy
 import pennylane as qml
 from pennylane import numpy as np
+from numpy.lib.format import open_memmap
+
+# The shared optimization loop lives in tools/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tools"))
+from vqe import run_method
 
 # Increase the number of qubits to capture more degrees of freedom
 num_qubits = 20
@@ -47,9 +57,8 @@ def nh3_hamiltonian():
 
     return qml.Hamiltonian(coeffs, obs)
 
-# Define the quantum circuit for NH3
-@qml.qnode(dev)
-def nh3_circuit(params, excitation=False):
+# NH3 state preparation, shared by the NH3 and interaction circuits
+def nh3_ansatz(params, excitation=False):
     # Prepare initial state
     for i in range(num_qubits):
         qml.RY(params[i], wires=i)
@@ -68,16 +77,25 @@ def nh3_circuit(params, excitation=False):
     # Excitation if requested
     if excitation:
         qml.PauliX(0)
-    
+
+# Define the quantum circuit for NH3
+@qml.qnode(dev)
+def nh3_circuit(params, excitation=False):
+    nh3_ansatz(params, excitation)
     return qml.expval(nh3_hamiltonian())
 
 # Function to optimize the VQE
-def vqe_optimize(circuit, initial_params, steps=200):
-    opt = qml.AdamOptimizer(stepsize=0.1)
+def vqe_optimize(circuit, initial_params, steps=200, opt=None, start=0, callback=None, method=None):
+    if method is not None:
+        return run_method(circuit, initial_params, steps, method, opt=opt, start=start, callback=callback)
+    
+    opt = qml.AdamOptimizer(stepsize=0.1) if opt is None else opt
     params = initial_params
 
-    for i in range(steps):
+    for i in range(start, steps):
         params = opt.step(circuit, params)
+        if callback is not None:
+            callback(i + 1, params, opt)
         if (i + 1) % 20 == 0:
             print(f"Step {i+1}: Energy = {circuit(params):.6f}")
 
@@ -91,27 +109,144 @@ def excited_state(ground_params):
     excited_params, excited_energy = vqe_optimize(excited_circuit, ground_params)
     return excited_params, excited_energy
 
+# Interaction circuit: the NH3 state, an RY layer for the target molecule and CNOTs coupling them
+@qml.qnode(dev)
+def interaction_circuit(nh3_p, target_p):
+    # NH3 circuit
+    nh3_ansatz(nh3_p)
+    
+    # Target molecule circuit (simplified)
+    for i in range(num_qubits // 2, num_qubits):
+        qml.RY(target_p[i - num_qubits // 2], wires=i)
+    
+    # Interaction terms (simplified)
+    for i in range(num_qubits // 2):
+        qml.CNOT(wires=[i, i + num_qubits // 2])
+    
+    return qml.expval(nh3_hamiltonian())
+
 # Function to model interaction with a target molecule (simplified)
 def interaction_energy(nh3_params, target_params):
-    @qml.qnode(dev)
-    def interaction_circuit(nh3_p, target_p):
-        # NH3 circuit
-        nh3_circuit(nh3_p)
-        
-        # Target molecule circuit (simplified)
-        for i in range(num_qubits // 2, num_qubits):
-            qml.RY(target_p[i - num_qubits // 2], wires=i)
-        
-        # Interaction terms (simplified)
-        for i in range(num_qubits // 2):
-            qml.CNOT(wires=[i, i + num_qubits // 2])
-        
-        return qml.expval(nh3_hamiltonian())
-    
     return interaction_circuit(nh3_params, target_params)
 
+# Grid of target parameter vectors: axes[k] holds the values scanned for target parameter k,
+# the remaining parameters stay at base. Returns the points and the shape of the surface.
+def target_param_grid(axes, base=None):
+    if base is None:
+        base = np.zeros(num_qubits // 2)
+    mesh = np.meshgrid(*axes, indexing="ij")
+    points = np.tile(np.array(base, requires_grad=False), (mesh[0].size, 1))
+    for k, values in enumerate(mesh):
+        points[:, k] = values.ravel()
+    return points, mesh[0].shape
+
+# The interaction scan in the Heisenberg picture. The CNOT layer C maps Pauli words to Pauli
+# words, so C H C is a Pauli sum with as many terms as H. The target layer RY(t) acts on the
+# lower half of the wires: RY(t)^dag X RY(t) = cos t X + sin t Z, RY(t)^dag Z RY(t) =
+# cos t Z - sin t X, and Y is unchanged. The energy is therefore a trigonometric polynomial in
+# the target parameters. Its coefficients are Pauli expectation values of the NH3 state. These
+# are computed once per scan, so each target point costs only the polynomial.
+@qml.qnode(dev)
+def nh3_state(nh3_p):
+    nh3_ansatz(nh3_p)
+    return qml.state()
+
+# Image of one Pauli under the CNOT layer: CNOT(i, i + half) for every i < half
+def cnot_image(wire, pauli):
+    half = num_qubits // 2
+    control, target = (wire, wire + half) if wire < half else (wire - half, wire)
+    images = {
+        (True, "X"): {control: "X", target: "X"}, (True, "Y"): {control: "Y", target: "X"}, (True, "Z"): {control: "Z"},
+        (False, "X"): {target: "X"}, (False, "Y"): {control: "Z", target: "Y"}, (False, "Z"): {control: "Z", target: "Z"},
+    }
+    return qml.pauli.PauliSentence({qml.pauli.PauliWord(images[wire == control, pauli]): 1.0})
+
+# Terms of the energy polynomial: the distinct Pauli words and, per term, (word index, coefficient,
+# trig factors). Factor k < half is cos(target_p[k]), half + k is sin(target_p[k]) and
+# 2 * half is 1 (padding).
+def interaction_terms(H):
+    half = num_qubits // 2
+    conjugated = qml.pauli.PauliSentence()
+    for word, coeff in qml.pauli.pauli_sentence(H).items():
+        image = qml.pauli.PauliSentence({qml.pauli.PauliWord({}): coeff})
+        for wire, pauli in word.items():
+            image = image @ cnot_image(wire, pauli)
+        conjugated += image
+    
+    words, terms = {}, []
+    for word, coeff in conjugated.items():
+        expanded = [(dict(word), coeff, [])]
+        for wire in range(half, num_qubits):
+            pauli = word.get(wire, "I")
+            if pauli in ("X", "Z"):
+                swapped, sign = ("Z", 1) if pauli == "X" else ("X", -1)
+                expanded = [branch for w, c, f in expanded
+                            for branch in ((w, c, f + [wire - half]), ({**w, wire: swapped}, sign * c, f + [wire]))]
+        for w, c, f in expanded:
+            key = qml.pauli.PauliWord(w)
+            terms.append((words.setdefault(key, len(words)), c, f))
+    
+    width = max(len(f) for _, _, f in terms)
+    factors = numpy.array([f + [2 * half] * (width - len(f)) for _, _, f in terms], dtype=int)
+    return list(words), numpy.array([t[0] for t in terms]), numpy.array([t[1] for t in terms]), factors
+
+# <state|word|state> for each Pauli word. A word maps |j> to i^(number of Y) times the Z/Y
+# signs of j times |j with its X/Y bits flipped>. Flipping a bit reverses that wire's axis of
+# the state tensor. Words that flip the same wires share conj(state[j]) state[flipped j]. This
+# product is summed down to the few wires those words sign.
+def word_expvals(state, words):
+    psi = state.reshape((2,) * num_qubits)
+    groups = {}
+    for n, word in enumerate(words):
+        groups.setdefault(tuple(w for w, p in sorted(word.items()) if p in ("X", "Y")), []).append(n)
+    values = numpy.zeros(len(words), dtype=complex)
+    for flips, members in groups.items():
+        flipped = psi[tuple(slice(None, None, -1) if w in flips else slice(None) for w in range(num_qubits))]
+        signed = sorted({w for n in members for w, p in words[n].items() if p in ("Y", "Z")})
+        marginal = (numpy.conj(psi) * flipped).sum(axis=tuple(w for w in range(num_qubits) if w not in signed))
+        for n in members:
+            signs = numpy.ones(marginal.shape)
+            for w, p in words[n].items():
+                if p in ("Y", "Z"):
+                    axis = signed.index(w)
+                    # The sign comes from the flipped index, so a flipped wire starts at -1
+                    sign = numpy.array([-1, 1] if w in flips else [1, -1])
+                    signs = signs * sign.reshape([2 if a == axis else 1 for a in range(len(signed))])
+            values[n] = 1j ** sum(p == "Y" for p in words[n].values()) * numpy.sum(marginal * signs)
+    return values
+
+# Evaluate interaction energies for many target parameter vectors in batches. With out_path
+# set, energies are streamed into a .npy memmap as each batch finishes.
+def scan_interaction_energy(nh3_params, target_points, shape=None, batch_size=256, out_path=None):
+    # Plain NumPy inputs keep the scan off the autograd path; no gradients are needed here
+    target_points = qml.math.to_numpy(target_points)
+    num_points = len(target_points)
+    state = qml.math.to_numpy(nh3_state(qml.math.to_numpy(nh3_params)))
+    words, word_index, coeffs, factors = interaction_terms(nh3_hamiltonian())
+    weights = coeffs * word_expvals(state, words)[word_index]
+    
+    if out_path is not None:
+        energies = open_memmap(out_path, mode="w+", dtype=float, shape=(num_points,))
+    else:
+        energies = np.zeros(num_points)
+    
+    for start in range(0, num_points, batch_size):
+        batch = target_points[start:start + batch_size]
+        trig = numpy.concatenate([numpy.cos(batch), numpy.sin(batch), numpy.ones((len(batch), 1))], axis=1)
+        energies[start:start + len(batch)] = numpy.real(numpy.prod(trig[:, factors], axis=2) @ weights)
+        if out_path is not None:
+            energies.flush()
+        print(f"Scanned {min(start + batch_size, num_points)}/{num_points} target points")
+    
+    return np.array(energies).reshape(shape if shape is not None else (num_points,))
+
 # Main execution
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NH3 ground and excited states and target interaction")
+    parser.add_argument("--scan", type=int, metavar="N", help="also scan the interaction energy over an N x N grid "
+                        "of two target parameters")
+    args = parser.parse_args()
+    
     print("NH3 Ground State Energy Simulation")
     
     num_params = num_qubits * 11
@@ -131,4 +266,12 @@ if __name__ == "__main__":
     print("\nModeling Interaction with Target Molecule")
     target_params = np.random.random(num_qubits // 2)
     interaction_e = interaction_energy(ground_params, target_params)
-    print(f"Interaction energy = {interaction_e:.6f}")
\ No newline at end of file
+    print(f"Interaction energy = {interaction_e:.6f}")
+    
+    if args.scan:
+        print("\nScanning interaction energy over two target parameters")
+        axis = np.linspace(0, np.pi, args.scan)
+        points, shape = target_param_grid([axis, axis], base=target_params)
+        surface = scan_interaction_energy(ground_params, points, shape)
+        best = np.unravel_index(np.argmin(surface), shape)
+        print(f"Lowest interaction energy = {surface[best]:.6f} at target parameters {axis[best[0]]:.3f}, {axis[best[1]]:.3f}")
\ No newline at end of file
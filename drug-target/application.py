@@ -1,6 +1,13 @@
+import os
+import sys
+
 import pennylane as qml
 from pennylane import numpy as np
 
+# The shared optimization loop lives in tools/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tools"))
+from vqe import run_method
+
 # Set the number of qubits (adjust based on your specific drug and target representation)
 num_qubits_drug = 6
 num_qubits_target = 6
@@ -61,13 +68,25 @@ def dti_circuit(params):
     
     return qml.expval(dti_hamiltonian())
 
-# Function to optimize the VQE
-def vqe_optimize(circuit, initial_params, steps=100):
-    opt = qml.AdamOptimizer(stepsize=0.1)
+# Function to optimize the VQE. With opt=qml.QNGOptimizer(...) and a metric_fn(params)
+# (e.g. a block-diagonal metric) the metric is only recomputed every metric_refresh steps.
+def vqe_optimize(circuit, initial_params, steps=100, opt=None, start=0, callback=None,
+                 metric_fn=None, metric_refresh=5, method=None):
+    if method is not None:
+        return run_method(circuit, initial_params, steps, method, opt=opt, start=start, callback=callback,
+                          metric_fn=metric_fn)
+    
+    opt = qml.AdamOptimizer(stepsize=0.1) if opt is None else opt
     params = initial_params
 
-    for i in range(steps):
-        params = opt.step(circuit, params)
+    for i in range(start, steps):
+        if metric_fn is not None:
+            params = opt.step(circuit, params, metric_tensor_fn=metric_fn,
+                              recompute_tensor=(i - start) % metric_refresh == 0)
+        else:
+            params = opt.step(circuit, params)
+        if callback is not None:
+            callback(i + 1, params, opt)
         if (i + 1) % 20 == 0:
             print(f"Step {i+1}: Interaction Energy = {circuit(params):.6f}")
 
@@ -1,22 +1,32 @@
+import os
+import sys
+
 import pennylane as qml
 from pennylane import numpy as np
 
+# The shared feature encoding lives in drug-target/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from feature_encoding import encoded_state
+
 # Always use 12 qubits
 num_qubits = 12
 
 # Create a quantum device
-dev = qml.device('default.qubit', wires=num_qubits)
+dev = qml.device('lightning.qubit', wires=num_qubits)
+
+# Mean of Z over all qubits as a single observable, so one adjoint sweep gives the gradient
+# (lightning.qubit applies it term by term; default.qubit's adjoint path builds a dense matrix)
+mean_z = qml.Hamiltonian([1 / num_qubits] * num_qubits, [qml.PauliZ(i) for i in range(num_qubits)])
+
+# Simulated KRAS protein features (e.g., for G12V mutation)
+kras_features = np.array([0.5, 1.2, 0.8, 1.5, 0.3, 0.9]) * np.pi
 
 # Define a quantum circuit for simulating drug-KRAS interaction
-@qml.qnode(dev)
+@qml.qnode(dev, diff_method="adjoint")
 def kras_drug_interaction(params, drug_features, kras_features):
-    # Encode drug features
-    for i in range(6):
-        qml.RY(drug_features[i], wires=i)
-    
-    # Encode KRAS protein features
-    for i in range(6, 12):
-        qml.RY(kras_features[i-6], wires=i)
+    # Start from the RY encoding of the drug and KRAS protein features (kras_features is
+    # fixed and cached; optimize_drug draws a new drug every step)
+    qml.StatePrep(encoded_state(drug_features[:6], kras_features[:6]), wires=range(num_qubits))
     
     # Apply parameterized gates
     for layer in range(2):
@@ -29,23 +39,27 @@ def kras_drug_interaction(params, drug_features, kras_features):
             qml.CZ(wires=[i, i+1])
         qml.CZ(wires=[num_qubits-1, 0])
     
-    # Measure the expectation value of Z on all qubits
-    return [qml.expval(qml.PauliZ(i)) for i in range(num_qubits)]
+    # Measure the mean Z expectation over all qubits
+    return qml.expval(mean_z)
 
 # Function to calculate binding affinity (lower is better)
 def binding_affinity(params, drug_features, kras_features):
-    interactions = kras_drug_interaction(params, drug_features, kras_features)
-    return qml.math.mean(qml.math.stack(interactions))
+    return kras_drug_interaction(params, drug_features, kras_features)
 
-# Optimization loop
-def optimize_drug(initial_params, kras_features, steps=100):
-    opt = qml.AdamOptimizer(stepsize=0.1)
+# Optimization loop. `opt` and `start` resume a run (the drug candidates come from the global
+# RNG, so a resumed run also needs its RNG state); `callback(step, params, opt)` is called
+# after every step. The last drug candidate is None when no step ran.
+def optimize_drug(initial_params, kras_features, steps=100, opt=None, start=0, callback=None):
+    opt = qml.AdamOptimizer(stepsize=0.1) if opt is None else opt
     params = initial_params
+    drug_features = None
 
     print("Starting drug optimization...")
-    for i in range(steps):
+    for i in range(start, steps):
         drug_features = np.random.random(6) * np.pi  # Simulate different drug candidates
         params = opt.step(lambda p: binding_affinity(p, drug_features, kras_features), params)
+        if callback is not None:
+            callback(i + 1, params, opt)
         
         if (i + 1) % 10 == 0:
             affinity = binding_affinity(params, drug_features, kras_features)
@@ -61,9 +75,6 @@ if __name__ == "__main__":
     num_params = 4 * num_qubits
     initial_params = np.random.random(num_params)
     
-    # Simulate KRAS protein features (e.g., for G12V mutation)
-    kras_features = np.array([0.5, 1.2, 0.8, 1.5, 0.3, 0.9]) * np.pi
-    
     # Run optimization
     optimal_params, best_drug_features = optimize_drug(initial_params, kras_features)
     
@@ -1,6 +1,16 @@
+import os
+import sys
+
 import pennylane as qml
 from pennylane import numpy as np
-import matplotlib.pyplot as plt
+
+# The shared feature encoding lives in drug-target/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from feature_encoding import encoded_state
+
+# The shared optimization loop lives in tools/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "tools"))
+from vqe import run_method
 
 # Define the number of qubits
 num_qubits_drug = 8  # Representing key features of the drug molecule
@@ -43,13 +53,9 @@ def dti_hamiltonian():
 # Define the quantum circuit for drug-target interaction
 @qml.qnode(dev)
 def dti_circuit(params, drug_features, protein_features):
-    # Encode drug features
-    for i in range(num_qubits_drug):
-        qml.RY(drug_features[i], wires=i)
-    
-    # Encode protein features
-    for i in range(num_qubits_protein):
-        qml.RY(protein_features[i], wires=i + num_qubits_drug)
+    # Start from the cached encoding of the drug and protein features
+    qml.StatePrep(encoded_state(drug_features[:num_qubits_drug], protein_features[:num_qubits_protein]),
+                  wires=range(num_qubits))
     
     # Entangling layers
     num_layers = 3
@@ -73,16 +79,34 @@ def dti_circuit(params, drug_features, protein_features):
     
     return qml.expval(dti_hamiltonian())
 
-# Function to optimize the VQE
-def vqe_optimize(circuit, initial_params, drug_features, protein_features, steps=200):
-    opt = qml.AdamOptimizer(stepsize=0.1)
+# Function to optimize the VQE. With opt=qml.QNGOptimizer(...) and a
+# metric_fn(params, drug_features, protein_features) (e.g. a block-diagonal metric) the
+# metric is only recomputed every metric_refresh steps.
+def vqe_optimize(circuit, initial_params, drug_features, protein_features, steps=200,
+                 opt=None, start=0, energies=None, callback=None, metric_fn=None, metric_refresh=5,
+                 method=None):
+    if method is not None:
+        params, energy = run_method(lambda p: circuit(p, drug_features, protein_features), initial_params, steps,
+                                    method, opt=opt, start=start, callback=callback, metric_fn=metric_fn)
+        energies = [] if energies is None else energies
+        energies.append(energy)
+        return params, energies
+    
+    opt = qml.AdamOptimizer(stepsize=0.1) if opt is None else opt
     params = initial_params
-    energies = []
+    energies = [] if energies is None else energies
+    cost = lambda p: circuit(p, drug_features, protein_features)
 
-    for i in range(steps):
-        params = opt.step(lambda p: circuit(p, drug_features, protein_features), params)
+    for i in range(start, steps):
+        if metric_fn is not None:
+            params = opt.step(cost, params, recompute_tensor=(i - start) % metric_refresh == 0,
+                              metric_tensor_fn=lambda p: metric_fn(p, drug_features, protein_features))
+        else:
+            params = opt.step(cost, params)
         energy = circuit(params, drug_features, protein_features)
         energies.append(energy)
+        if callback is not None:
+            callback(i + 1, params, opt)
         if (i + 1) % 20 == 0:
             print(f"Step {i+1}: Interaction Energy = {energy:.6f}")
 
@@ -121,9 +145,14 @@ if __name__ == "__main__":
     print(interpret_interaction(final_energy))
     
     # Plot the optimization progress
-    plt.figure(figsize=(10, 6))
-    plt.plot(energies)
-    plt.title("Drug-Target Interaction Optimization")
-    plt.xlabel("Optimization Step")
-    plt.ylabel("Interaction Energy")
-    plt.show()
\ No newline at end of file
+    try:
+        import matplotlib.pyplot as plt
+
+        plt.figure(figsize=(10, 6))
+        plt.plot(energies)
+        plt.title("Drug-Target Interaction Optimization")
+        plt.xlabel("Optimization Step")
+        plt.ylabel("Interaction Energy")
+        plt.show()
+    except ImportError:
+        print("Matplotlib not available for visualization.")
\ No newline at end of file
@@ -0,0 +1,51 @@
+import threading
+
+from autograd.tracer import Box
+import pennylane as qml
+from pennylane import numpy as np
+
+# RY feature encoding shared by the drug-target scripts. A feature f sets one qubit to
+# RY(f)|0> = cos(f/2)|0> + sin(f/2)|1>, so a feature vector encodes to a product state.
+# Each vector's state is cached by its values. A register's encoding is the Kronecker
+# product of its vectors' states. A vector that changes on every call, such as a new random
+# drug each optimization step, therefore only adds its own small entry to the cache.
+# Scripts in the subdirectories import this module through their parent directory.
+
+feature_state_cache = {}
+max_cached_states = 1024
+# The repurposing kernel fills the cache from several threads
+cache_lock = threading.Lock()
+
+# Autograd boxes and JAX tracers have no concrete values to key on
+def is_traced(features):
+    return isinstance(features, Box) or qml.math.is_abstract(features)
+
+def build_state(features):
+    state = None
+    for f in features:
+        qubit = qml.math.stack([qml.math.cos(f / 2), qml.math.sin(f / 2)])
+        state = qubit if state is None else qml.math.kron(state, qubit)
+    return state
+
+# RY-encoded product state of one feature vector; traced features are encoded without the
+# cache so that gradients flow through them
+def feature_state(features):
+    if is_traced(features):
+        return build_state(features)
+    key = tuple(qml.math.to_numpy(features).ravel().tolist())
+    with cache_lock:
+        state = feature_state_cache.get(key)
+    if state is None:
+        state = np.array(build_state(np.array(key)), requires_grad=False)
+        with cache_lock:
+            if len(feature_state_cache) >= max_cached_states:
+                feature_state_cache.pop(next(iter(feature_state_cache)))
+            feature_state_cache[key] = state
+    return state
+
+# Encoded state of a register made of several feature vectors, e.g. (drug, target)
+def encoded_state(*feature_sets):
+    state = feature_state(feature_sets[0])
+    for features in feature_sets[1:]:
+        state = qml.math.kron(state, feature_state(features))
+    return state
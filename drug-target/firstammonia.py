@@ -1,6 +1,13 @@
+import os
+import sys
+
 import pennylane as qml
 from pennylane import numpy as np
 
+# The shared optimization loop lives in tools/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tools"))
+from vqe import run_method
+
 # Define the number of qubits
 num_qubits = 4  # One for each atom in NH3
 
@@ -37,12 +44,17 @@ def nh3_circuit(params):
     return qml.expval(nh3_hamiltonian())
 
 # Function to optimize the VQE
-def vqe_optimize(circuit, initial_params, steps=100):
-    opt = qml.GradientDescentOptimizer(stepsize=0.4)
+def vqe_optimize(circuit, initial_params, steps=100, opt=None, start=0, callback=None, method=None):
+    if method is not None:
+        return run_method(circuit, initial_params, steps, method, opt=opt, start=start, callback=callback)
+    
+    opt = qml.GradientDescentOptimizer(stepsize=0.4) if opt is None else opt
     params = initial_params
 
-    for i in range(steps):
+    for i in range(start, steps):
         params = opt.step(circuit, params)
+        if callback is not None:
+            callback(i + 1, params, opt)
         if (i + 1) % 20 == 0:
             print(f"Step {i+1}: Energy = {circuit(params):.6f}")
 
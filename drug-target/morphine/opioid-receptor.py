@@ -3,10 +3,20 @@ from pennylane import numpy as np
 
 # Set up the device
 num_qubits = 8  # Representing key interaction points
-dev = qml.device('default.qubit', wires=num_qubits)
+dev = qml.device('lightning.qubit', wires=num_qubits)
+
+# Mean of Z over all qubits as a single observable, so one adjoint sweep gives the gradient
+# (lightning.qubit applies it term by term; default.qubit's adjoint path builds a dense matrix)
+mean_z = qml.Hamiltonian([1 / num_qubits] * num_qubits, [qml.PauliZ(i) for i in range(num_qubits)])
+
+# Morphine features (simplified)
+morphine_features = np.array([0.5, 0.7, 0.3, 0.6]) * np.pi
+
+# MOR features (simplified)
+mor_features = np.array([0.8, 0.4, 0.9, 0.2]) * np.pi
 
 # Define the quantum circuit for morphine-MOR interaction
-@qml.qnode(dev)
+@qml.qnode(dev, diff_method="adjoint")
 def morphine_mor_interaction(params, features):
     # Encode morphine features
     for i in range(4):
@@ -29,79 +39,77 @@ def morphine_mor_interaction(params, features):
     for i in range(num_qubits-1):
         qml.CZ(wires=[i, i+1])
     
-    # Measure the state of the system
-    return [qml.expval(qml.PauliZ(i)) for i in range(num_qubits)]
+    # Measure the mean Z expectation over all qubits
+    return qml.expval(mean_z)
 
 # Function to calculate binding affinity
 def binding_affinity(params, morphine_features, mor_features):
     features = np.concatenate([morphine_features, mor_features])
-    result = morphine_mor_interaction(params, features)
-    return qml.math.mean(qml.math.stack(result))
+    return morphine_mor_interaction(params, features)
 
-# Optimization function
-def optimize_interaction(steps=100):
+# Optimization function. `init_params`, `opt` and `start` resume a run; `callback(step, params,
+# opt)` is called after every step.
+def optimize_interaction(steps=100, opt=None, start=0, callback=None, init_params=None):
     np.random.seed(42)
     
     # Initialize parameters
     num_params = 2 * num_qubits
     params = np.random.random(num_params) * np.pi
-    
-    # Morphine features (simplified)
-    morphine_features = np.array([0.5, 0.7, 0.3, 0.6]) * np.pi
-    
-    # MOR features (simplified)
-    mor_features = np.array([0.8, 0.4, 0.9, 0.2]) * np.pi
+    if init_params is not None:
+        params = init_params
     
     # Define the optimizer here
-    opt = qml.AdamOptimizer(stepsize=0.1)
+    opt = qml.AdamOptimizer(stepsize=0.1) if opt is None else opt
     
-    for i in range(steps):
+    for i in range(start, steps):
         params = opt.step(lambda p: binding_affinity(p, morphine_features, mor_features), params)
+        if callback is not None:
+            callback(i + 1, params, opt)
         
         if (i + 1) % 10 == 0:
             print(f"Step {i+1}: Binding Affinity = {binding_affinity(params, morphine_features, mor_features):.6f}")
     
     return params
 
-# Run the simulation
-print("Simulating Morphine-MOR Interaction")
-final_params = optimize_interaction()
+# Main execution
+if __name__ == "__main__":
+    # Run the simulation
+    print("Simulating Morphine-MOR Interaction")
+    final_params = optimize_interaction()
 
-# Final binding affinity
-morphine_features = np.array([0.5, 0.7, 0.3, 0.6]) * np.pi
-mor_features = np.array([0.8, 0.4, 0.9, 0.2]) * np.pi
-final_affinity = binding_affinity(final_params, morphine_features, mor_features)
-print(f"\nFinal Morphine-MOR Binding Affinity: {final_affinity:.6f}")
+    # Final binding affinity
+    final_affinity = binding_affinity(final_params, morphine_features, mor_features)
+    print(f"\nFinal Morphine-MOR Binding Affinity: {final_affinity:.6f}")
 
-# Interpret results
-if final_affinity > -0.3:
-    print("Weak binding: Consistent with morphine's lower efficacy")
-elif final_affinity > -0.6:
-    print("Moderate binding: Typical for morphine's partial agonist activity")
-else:
-    print("Strong binding: Unexpected for morphine, might indicate overfitting")
+    # Interpret results
+    if final_affinity > -0.3:
+        print("Weak binding: Consistent with morphine's lower efficacy")
+    elif final_affinity > -0.6:
+        print("Moderate binding: Typical for morphine's partial agonist activity")
+    else:
+        print("Strong binding: Unexpected for morphine, might indicate overfitting")
 
-print("\nNote: This simulation simplifies complex molecular interactions.")
+    print("\nNote: This simulation simplifies complex molecular interactions.")
 
-# Optional: Visualize the optimization process
-try:
-    import matplotlib.pyplot as plt
+    # Optional: Visualize the optimization process
+    try:
+        import matplotlib.pyplot as plt
 
-    # Collect data during optimization
-    affinities = []
-    steps = 100
-    params = final_params  # Start from the optimized parameters
-    opt = qml.AdamOptimizer(stepsize=0.1)  # Define optimizer again for visualization
-    for i in range(steps):
-        affinity = binding_affinity(params, morphine_features, mor_features)
-        affinities.append(affinity)
-        params = opt.step(lambda p: binding_affinity(p, morphine_features, mor_features), params)
+        # Collect data during optimization
+        affinities = []
+        steps = 100
+        params = final_params  # Start from the optimized parameters
+        opt = qml.AdamOptimizer(stepsize=0.1)  # Define optimizer again for visualization
+        for i in range(steps):
+            affinity = binding_affinity(params, morphine_features, mor_features)
+            affinities.append(affinity)
+            params = opt.step(lambda p: binding_affinity(p, morphine_features, mor_features), params)
 
-    plt.figure(figsize=(10, 6))
-    plt.plot(range(1, steps + 1), affinities)
-    plt.title("Morphine-MOR Binding Affinity Optimization")
-    plt.xlabel("Optimization Step")
-    plt.ylabel("Binding Affinity")
-    plt.show()
-except ImportError:
-    print("Matplotlib not available for visualization.")
\ No newline at end of file
+        plt.figure(figsize=(10, 6))
+        plt.plot(range(1, steps + 1), affinities)
+        plt.title("Morphine-MOR Binding Affinity Optimization")
+        plt.xlabel("Optimization Step")
+        plt.ylabel("Binding Affinity")
+        plt.show()
+    except ImportError:
+        print("Matplotlib not available for visualization.")
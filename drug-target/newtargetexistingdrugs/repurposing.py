@@ -1,20 +1,45 @@
+import hashlib
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
 import pennylane as qml
 from pennylane import numpy as np
 
+# The shared feature encoding lives in drug-target/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from feature_encoding import encoded_state, feature_state
+
+# The shared optimization loop lives in tools/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "tools"))
+from vqe import run_method
+
 # Set up the device
 num_qubits = 12  # Representing drug features and potential targets
-dev = qml.device('default.qubit', wires=num_qubits)
+dev = qml.device('lightning.qubit', wires=num_qubits)
+
+# Mean of Z over all qubits as a single observable, so one adjoint sweep gives the gradient
+# (lightning.qubit applies it term by term; default.qubit's adjoint path builds a dense matrix)
+mean_z = qml.Hamiltonian([1 / num_qubits] * num_qubits, [qml.PauliZ(i) for i in range(num_qubits)])
+
+# Sildenafil features (simplified representation), shared with tools/checkpoint.py
+sildenafil_features = np.array([0.8, 0.6, 0.9, 0.5, 0.7, 0.4]) * np.pi
+
+# Target proteins (with simplified feature representations)
+targets = {
+    "PDE5 (ED treatment, known target)": np.array([0.9, 0.8, 0.7, 0.6, 0.5, 0.4]) * np.pi,
+    "PDE6 (Vision side effects)": np.array([0.85, 0.75, 0.65, 0.55, 0.45, 0.35]) * np.pi,
+    "Myosin light chain kinase (Potential cramp target)": np.array([0.5, 0.4, 0.3, 0.2, 0.1, 0.0]) * np.pi,
+    "Nitric oxide synthase (Blood flow)": np.array([0.7, 0.6, 0.5, 0.4, 0.3, 0.2]) * np.pi
+}
 
 # Define the quantum circuit for drug-target interaction
-@qml.qnode(dev)
+@qml.qnode(dev, diff_method="adjoint")
 def drug_target_interaction(params, drug_features, target_features):
-    # Encode drug features
-    for i in range(6):
-        qml.RY(drug_features[i], wires=i)
-    
-    # Encode target features
-    for i in range(6, 12):
-        qml.RY(target_features[i-6], wires=i)
+    # Start from the cached encoding of the drug and target features
+    qml.StatePrep(encoded_state(drug_features[:6], target_features[:6]), wires=range(num_qubits))
     
     # Apply parameterized gates
     for layer in range(4):
@@ -29,16 +54,20 @@ def drug_target_interaction(params, drug_features, target_features):
             qml.CZ(wires=[i, i+1])
         qml.CZ(wires=[num_qubits-1, 0])
     
-    # Measure the state of the system
-    return [qml.expval(qml.PauliZ(i)) for i in range(num_qubits)]
+    # Measure the mean Z expectation over all qubits
+    return qml.expval(mean_z)
 
 # Function to calculate binding affinity
 def binding_affinity(params, drug_features, target_features):
     result = drug_target_interaction(params, drug_features, target_features)
-    return 1 - qml.math.abs(qml.math.mean(qml.math.stack(result)))
+    return 1 - qml.math.abs(result)
 
 # Function to simulate drug repurposing
-def simulate_drug_repurposing(known_drug_features, targets, optimization_steps=300):
+# `resume` continues a run from the state passed to `callback` (a dict with the target index,
+# step, current target parameters, optimizer and affinities so far), e.g. after a checkpoint.
+# `method` optimizes each target with tools/vqe.py instead (see run_method).
+def simulate_drug_repurposing(known_drug_features, targets, optimization_steps=300, trained_params=None,
+                              resume=None, callback=None, method=None, opt=None):
     np.random.seed(42)
     
     # Initialize parameters
@@ -47,38 +76,183 @@ def simulate_drug_repurposing(known_drug_features, targets, optimization_steps=3
     
     # Optimize for each target
     affinities = []
-    opt = qml.AdamOptimizer(stepsize=0.01)
+    opt = qml.AdamOptimizer(stepsize=0.01) if opt is None and method is None else opt
+    if resume is not None:
+        affinities = list(resume["affinities"])
+        opt = resume["opt"]
     
-    for name, target_features in targets.items():
+    for target_index, (name, target_features) in enumerate(targets.items()):
+        if resume is not None and target_index < resume["target_index"]:
+            continue
         print(f"Simulating interaction with {name}")
         
         target_params = params.copy()
-        for step in range(optimization_steps):
-            target_params = opt.step(lambda p: -binding_affinity(p, known_drug_features, target_features), target_params)
+        start = 0
+        if resume is not None and target_index == resume["target_index"]:
+            target_params, start = resume["params"], resume["step"]
+        cost = lambda p: -binding_affinity(p, known_drug_features, target_features)
+        if method is not None:
+            target_params, _ = run_method(cost, target_params, optimization_steps, method, stepsize=0.01, opt=opt,
+                                          resume=resume, callback=callback)
+            start = optimization_steps
+        for step in range(start, optimization_steps):
+            target_params = opt.step(cost, target_params)
+            if callback is not None:
+                callback({"target_index": target_index, "step": step + 1, "params": target_params,
+                          "opt": opt, "affinities": affinities})
         
         final_affinity = binding_affinity(target_params, known_drug_features, target_features)
         affinities.append((name, final_affinity))
         print(f"Final affinity: {final_affinity:.6f}")
+        
+        # Keep the trained parameters so the target can be used to screen a drug library
+        if trained_params is not None:
+            trained_params[name] = target_params
     
     return affinities
 
+# RBF kernel between two sets of drug feature vectors
+def rbf_kernel(a, b, length_scale):
+    sq_dist = np.sum((a[:, None, :] - b[None, :, :]) ** 2, axis=-1)
+    return np.exp(-sq_dist / (2 * length_scale ** 2))
+
+# Kernel ridge surrogate fitted on quantum-scored drugs; returns the predicted
+# affinity and its uncertainty (Gaussian-process posterior std) for each candidate
+def surrogate_predict(train_x, train_y, test_x, reg=1e-3):
+    pair_dist = np.sqrt(np.sum((train_x[:, None, :] - train_x[None, :, :]) ** 2, axis=-1))
+    length_scale = np.median(pair_dist[pair_dist > 0]) if np.any(pair_dist > 0) else 1.0
+    
+    y_mean = np.mean(train_y)
+    y_scale = np.std(train_y) + 1e-12
+    k = rbf_kernel(train_x, train_x, length_scale) + reg * np.eye(len(train_x))
+    k_star = rbf_kernel(test_x, train_x, length_scale)
+    
+    mean = k_star @ np.linalg.solve(k, train_y - y_mean) + y_mean
+    var = 1 - np.sum(k_star * np.linalg.solve(k, k_star.T).T, axis=1)
+    return mean, np.sqrt(np.maximum(var, 0)) * y_scale
+
+# Fraction of the reference top-k drugs that the screen also placed in its top-k
+def topk_recall(selected, reference_scores, k):
+    reference_top = set(np.argsort(-np.array(reference_scores))[:k].tolist())
+    return len(reference_top & set(selected[:k])) / k
+
+# Rank a drug library against one target, sending only uncertain candidates to the quantum model.
+# Each round fits the surrogate on all quantum-scored drugs, discards candidates whose optimistic
+# estimate cannot reach the current top-k, and quantum-scores the most promising uncertain ones.
+# Candidates still uncertain after max_rounds are quantum-scored too, so none is dropped unseen.
+# The initial sample is drawn from a local generator seeded with `seed`.
+def screen_drug_library(params, drug_library, target_features, top_k=10, initial_samples=20,
+                        batch_size=10, max_rounds=20, confidence=2.0, seed=7):
+    rng = numpy.random.default_rng(seed)
+    library = np.array(drug_library, requires_grad=False)
+    num_drugs = len(library)
+    
+    scores = {}
+    def quantum_score(indices):
+        for idx in indices:
+            scores[int(idx)] = float(binding_affinity(params, library[idx], target_features))
+    
+    quantum_score(rng.permutation(num_drugs)[:min(initial_samples, num_drugs)])
+    candidates = [i for i in range(num_drugs) if i not in scores]
+    discarded = 0
+    
+    for round_index in range(max_rounds):
+        if not candidates:
+            break
+        
+        scored = sorted(scores)
+        mean, std = surrogate_predict(library[scored], np.array([scores[i] for i in scored]), library[candidates])
+        upper = mean + confidence * std
+        lower = mean - confidence * std
+        
+        # The k-th best value that is already guaranteed (measured, or pessimistic surrogate estimate)
+        guaranteed = np.sort(np.concatenate([np.array([scores[i] for i in scored]), lower]))[::-1]
+        threshold = guaranteed[min(top_k, len(guaranteed)) - 1]
+        
+        keep = upper >= threshold
+        discarded += int(np.sum(~keep))
+        candidates = [c for c, kept in zip(candidates, keep) if kept]
+        upper = upper[keep]
+        
+        # Resolve the most promising uncertain candidates with the quantum model
+        order = np.argsort(-upper)[:batch_size]
+        quantum_score([candidates[i] for i in order])
+        candidates = [c for c in candidates if c not in scores]
+        print(f"Round {round_index + 1}: {len(scores)} quantum-scored, {discarded} discarded, {len(candidates)} uncertain")
+    
+    if candidates:
+        print(f"Quantum-scoring the {len(candidates)} candidates still uncertain after {max_rounds} rounds")
+        quantum_score(candidates)
+    
+    ranked = sorted(scores, key=lambda i: scores[i], reverse=True)[:top_k]
+    return [(i, scores[i]) for i in ranked], len(scores)
+
+# Fidelity kernel |<x|y>|^2 between two sets of feature vectors as one matrix product
+def kernel_block(row_features, col_features):
+    rows = np.array([feature_state(f) for f in row_features], requires_grad=False)
+    cols = np.array([feature_state(f) for f in col_features], requires_grad=False)
+    return np.abs(rows @ cols.T) ** 2
+
+# One kernel block, loaded from cache_dir if it was computed before. Blocks are stored under a
+# hash of the dtype, shape and bytes of their row and column features, so a grown feature list
+# only computes the new blocks. A block is written to a temporary file and renamed into place,
+# so other threads and runs never load a partly written block.
+def cached_block(rows, cols, cache_dir=None):
+    path = None
+    if cache_dir is not None:
+        rows, cols = numpy.ascontiguousarray(rows), numpy.ascontiguousarray(cols)
+        header = repr((rows.dtype.str, rows.shape, cols.dtype.str, cols.shape)).encode()
+        digest = hashlib.sha1(header + rows.tobytes() + cols.tobytes()).hexdigest()
+        path = os.path.join(cache_dir, f"kernel-{digest}.npy")
+        if os.path.exists(path):
+            return np.load(path)
+    values = kernel_block(rows, cols)
+    if path is not None:
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, values)
+        os.replace(tmp, path)
+    return values
+
+def evaluate_blocks(rows, cols, blocks, block_size, cache_dir, max_workers):
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+    def evaluate(block):
+        i, j = block
+        return block, cached_block(rows[i:i + block_size], cols[j:j + block_size], cache_dir)
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+        yield from pool.map(evaluate, blocks)
+
+# Fidelity-kernel matrix over a list of feature vectors. Only blocks on or above the diagonal are
+# evaluated (K = K^T), blocks run in parallel threads and are cached in cache_dir.
+def kernel_matrix(feature_vectors, block_size=64, cache_dir=None, max_workers=None):
+    features = np.array(feature_vectors, dtype=float, requires_grad=False)
+    n = len(features)
+    blocks = [(i, j) for i in range(0, n, block_size) for j in range(i, n, block_size)]
+    kernel = np.zeros((n, n), requires_grad=False)
+    for (i, j), values in evaluate_blocks(features, features, blocks, block_size, cache_dir, max_workers):
+        kernel[i:i + block_size, j:j + block_size] = values
+        kernel[j:j + block_size, i:i + block_size] = values.T
+    return kernel
+
+# Drug x target fidelity kernel. Only the cross block is computed, in row blocks of drugs
+# against column blocks of targets; a growing drug list keeps earlier blocks cached.
+def drug_target_kernel(drug_features, target_features, block_size=64, cache_dir=None, max_workers=None):
+    drugs = np.array(drug_features, dtype=float, requires_grad=False)
+    targets = np.array(target_features, dtype=float, requires_grad=False)
+    blocks = [(i, j) for i in range(0, len(drugs), block_size) for j in range(0, len(targets), block_size)]
+    kernel = np.zeros((len(drugs), len(targets)), requires_grad=False)
+    for (i, j), values in evaluate_blocks(drugs, targets, blocks, block_size, cache_dir, max_workers):
+        kernel[i:i + block_size, j:j + block_size] = values
+    return kernel
+
 # Main execution
 if __name__ == "__main__":
     print("Sildenafil (Viagra) Repurposing Simulation")
     
-    # Sildenafil features (simplified representation)
-    sildenafil_features = np.array([0.8, 0.6, 0.9, 0.5, 0.7, 0.4]) * np.pi
-    
-    # Target proteins (with simplified feature representations)
-    targets = {
-        "PDE5 (ED treatment, known target)": np.array([0.9, 0.8, 0.7, 0.6, 0.5, 0.4]) * np.pi,
-        "PDE6 (Vision side effects)": np.array([0.85, 0.75, 0.65, 0.55, 0.45, 0.35]) * np.pi,
-        "Myosin light chain kinase (Potential cramp target)": np.array([0.5, 0.4, 0.3, 0.2, 0.1, 0.0]) * np.pi,
-        "Nitric oxide synthase (Blood flow)": np.array([0.7, 0.6, 0.5, 0.4, 0.3, 0.2]) * np.pi
-    }
-    
     # Run the simulation
-    affinities = simulate_drug_repurposing(sildenafil_features, targets)
+    trained_params = {}
+    affinities = simulate_drug_repurposing(sildenafil_features, targets, trained_params=trained_params)
     
     # Sort results by affinity
     sorted_affinities = sorted(affinities, key=lambda x: x[1], reverse=True)
@@ -88,6 +262,27 @@ if __name__ == "__main__":
     for i, (name, affinity) in enumerate(sorted_affinities, 1):
         print(f"{i}. {name}: {affinity:.6f}")
     
+    # Screen a drug library against the top-ranked target with the surrogate pre-filter
+    best_target = sorted_affinities[0][0]
+    drug_library = np.random.random((200, 6)) * np.pi
+    top_k = 10
+    print(f"\nScreening {len(drug_library)} drugs against {best_target}")
+    top_drugs, num_quantum = screen_drug_library(trained_params[best_target], drug_library, targets[best_target], top_k=top_k)
+    print(f"Quantum evaluations: {num_quantum} of {len(drug_library)}")
+    for i, (idx, affinity) in enumerate(top_drugs, 1):
+        print(f"{i}. Drug {idx}: {affinity:.6f}")
+    
+    # Measure top-k recall against exhaustive quantum scoring of the library
+    reference_scores = [binding_affinity(trained_params[best_target], d, targets[best_target]) for d in drug_library]
+    print(f"Top-{top_k} recall: {topk_recall([idx for idx, _ in top_drugs], reference_scores, top_k):.2f}")
+    
+    # Fidelity-kernel similarity between the library, Sildenafil and the targets
+    target_names = list(targets)
+    dt_kernel = drug_target_kernel([sildenafil_features] + list(drug_library), [targets[n] for n in target_names])
+    print("\nSildenafil quantum-kernel similarity to targets:")
+    for name, value in zip(target_names, dt_kernel[0]):
+        print(f"{name}: {value:.4f}")
+    
     # Visualize results
     try:
         import matplotlib.pyplot as plt
@@ -113,9 +308,11 @@ from pennylane import numpy as np
 # Increase the number of qubits for more complex representations
 num_qubits = 16
 
-dev = qml.device('default.qubit', wires=num_qubits)
+dev = qml.device('lightning.qubit', wires=num_qubits)
+
+mean_z = qml.Hamiltonian([1 / num_qubits] * num_qubits, [qml.PauliZ(i) for i in range(num_qubits)])
 
-@qml.qnode(dev)
+@qml.qnode(dev, diff_method="adjoint")
 def drug_target_interaction(params, drug_features, target_features):
     # Encode drug and target features
     for i in range(8):
@@ -138,12 +335,12 @@ def drug_target_interaction(params, drug_features, target_features):
         for i in range(num_qubits):
             qml.RX(np.pi/2, wires=i)
     
-    return [qml.expval(qml.PauliZ(i)) for i in range(num_qubits)]
+    return qml.expval(mean_z)
 
 def binding_affinity(params, drug_features, target_features):
     result = drug_target_interaction(params, drug_features, target_features)
     # Use PennyLane's math operations instead of NumPy
-    return qml.math.tanh(5 * qml.math.mean(qml.math.stack(result))) * 0.5 + 0.5
+    return qml.math.tanh(5 * result) * 0.5 + 0.5
 
 def simulate_drug_repurposing(known_drug_features, targets, optimization_steps=500):
     np.random.seed(42)
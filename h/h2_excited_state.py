@@ -1,6 +1,13 @@
+import os
+import sys
+
 import pennylane as qml
 from pennylane import numpy as np
 
+# The shared optimization loop lives in tools/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tools"))
+from vqe import run_method
+
 # Define the number of qubits
 num_qubits = 12
 
@@ -8,9 +15,9 @@ num_qubits = 12
 dev = qml.device('default.qubit', wires=num_qubits)
 
 # Define the H2 Hamiltonian (simplified model)
-def h2_hamiltonian():
+def h2_hamiltonian(bond=0.7):
     coeffs = np.array([
-        0.7,  # ZZ interaction for H-H bond
+        bond,  # ZZ interaction for H-H bond
         *[0.4] * num_qubits,  # Z on each qubit
         *[0.3] * (num_qubits - 1),  # XX interactions
         *[0.25] * (num_qubits - 1),  # YY interactions
@@ -47,19 +54,24 @@ def circuit(params):
     return qml.expval(H)
 
 # Function to find the ground state
-def find_ground_state(init_params):
-    opt = qml.AdamOptimizer(stepsize=0.1)
+def find_ground_state(init_params, steps=200, opt=None, start=0, callback=None, method=None):
+    if method is not None:
+        return run_method(circuit, init_params, steps, method, opt=opt, start=start, callback=callback)
+    
+    opt = qml.AdamOptimizer(stepsize=0.1) if opt is None else opt
     params = init_params
     
-    for i in range(200):
+    for i in range(start, steps):
         params = opt.step(circuit, params)
+        if callback is not None:
+            callback(i + 1, params, opt)
         if (i + 1) % 40 == 0:
             print(f"Step {i+1}: Energy = {circuit(params):.6f}")
     
     return params, circuit(params)
 
 # Function to find the first excited state
-def find_excited_state(ground_state_params):
+def find_excited_state(ground_state_params, init_params=None, steps=200):
     @qml.qnode(dev)
     def excited_circuit(params):
         # Prepare ground state
@@ -82,9 +94,9 @@ def find_excited_state(ground_state_params):
         return qml.expval(H)
     
     opt = qml.AdamOptimizer(stepsize=0.05)
-    params = np.random.random(num_qubits)
+    params = np.random.random(num_qubits) if init_params is None else init_params
     
-    for i in range(200):
+    for i in range(steps):
         params = opt.step(excited_circuit, params)
         if (i + 1) % 40 == 0:
             print(f"Step {i+1}: Energy = {excited_circuit(params):.6f}")
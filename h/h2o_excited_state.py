@@ -1,6 +1,13 @@
+import os
+import sys
+
 import pennylane as qml
 from pennylane import numpy as np
 
+# The shared optimization loop lives in tools/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tools"))
+from vqe import run_method
+
 # Define the number of qubits (now 12)
 num_qubits = 12
 
@@ -31,17 +38,22 @@ def circuit(params):
     return qml.expval(H)
 
 # Function to find the ground state
-def find_ground_state(init_params):
-    opt = qml.GradientDescentOptimizer(stepsize=0.4)
+def find_ground_state(init_params, steps=100, opt=None, start=0, callback=None, method=None):
+    if method is not None:
+        return run_method(circuit, init_params, steps, method, opt=opt, start=start, callback=callback)
+    
+    opt = qml.GradientDescentOptimizer(stepsize=0.4) if opt is None else opt
     params = init_params
     
-    for i in range(100):
+    for i in range(start, steps):
         params = opt.step(circuit, params)
+        if callback is not None:
+            callback(i + 1, params, opt)
     
     return params, circuit(params)
 
 # Function to find the first excited state
-def find_excited_state(ground_state_params):
+def find_excited_state(ground_state_params, init_params=None, steps=100):
     @qml.qnode(dev)
     def excited_circuit(params):
         # Prepare ground state
@@ -62,9 +74,9 @@ def find_excited_state(ground_state_params):
         return qml.expval(H)
     
     opt = qml.GradientDescentOptimizer(stepsize=0.1)
-    params = np.random.random(num_qubits)
+    params = np.random.random(num_qubits) if init_params is None else init_params
     
-    for i in range(100):
+    for i in range(steps):
         params = opt.step(excited_circuit, params)
     
     return params, excited_circuit(params)
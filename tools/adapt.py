@@ -0,0 +1,154 @@
+import argparse
+import time
+
+import numpy
+import pennylane as qml
+from pennylane import numpy as np
+from pennylane.devices.qubit import apply_operation
+
+from loader import hamiltonian_builder, load_script
+from vqe import minimize
+
+# ADAPT-style compact ansatz for the molecule scripts: instead of the 2^n StatePrep amplitudes,
+# grow a circuit of Pauli rotations exp(-i theta P / 2) from a basis reference state, each round
+# adding the pool generator with the largest energy gradient and re-optimizing all angles.
+# The parameter count is the number of rounds, and nothing of size 2^n is ever trained.
+
+single_paulis = {"X": qml.PauliX, "Y": qml.PauliY, "Z": qml.PauliZ}
+
+# Qubit pool: Y on every wire and XY/YX on every pair. These real generators keep the state
+# real, which is all a real Hamiltonian needs.
+def operator_pool(num_qubits):
+    pool = [("Y", (i,)) for i in range(num_qubits)]
+    for i in range(num_qubits):
+        for j in range(i + 1, num_qubits):
+            pool += [("XY", (i, j)), ("YX", (i, j))]
+    return pool
+
+# Diagonal (Z-only) part of H as (coefficient, wires) pairs
+def diagonal_terms(H):
+    terms = []
+    for word, c in qml.pauli.pauli_sentence(H).items():
+        if all(p == "Z" for p in word.values()):
+            terms.append((float(numpy.real(c)), list(word.keys())))
+    return terms
+
+# Basis-state reference: greedy bit flips on the diagonal energy starting from |0...0>.
+# Only the Z terms are evaluated, so this scales to any qubit count.
+def reference_state(H, num_qubits):
+    terms = diagonal_terms(H)
+    bits = numpy.zeros(num_qubits, dtype=int)
+    energy = lambda b: sum(c * (-1) ** int(numpy.sum(b[w])) for c, w in terms)
+    best = energy(bits)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(num_qubits):
+            bits[i] ^= 1
+            trial = energy(bits)
+            if trial < best - 1e-12:
+                best, improved = trial, True
+            else:
+                bits[i] ^= 1
+    return bits, best
+
+def apply_pauli(word, wires, state):
+    for p, w in zip(word, wires):
+        state = apply_operation(single_paulis[p](w), state)
+    return state
+
+# H|psi> term by term on the (2,)*n state tensor
+def apply_hamiltonian(H, state):
+    result = numpy.zeros_like(state)
+    for word, c in qml.pauli.pauli_sentence(H).items():
+        wires = list(word.keys())
+        result = result + c * apply_pauli("".join(word[w] for w in wires), wires, state)
+    return result
+
+# dE/dtheta at theta = 0 for appending exp(-i theta P / 2): -Im <P psi|H psi>, one pool
+# generator at a time against a single H|psi>
+def pool_gradients(state, H, pool):
+    h_state = apply_hamiltonian(H, state)
+    return numpy.array([-numpy.vdot(apply_pauli(word, wires, state), h_state).imag for word, wires in pool])
+
+def ansatz(reference, ops):
+    def circuit(params):
+        qml.BasisState(reference, wires=range(len(reference)))
+        for theta, (word, wires) in zip(params, ops):
+            qml.PauliRot(theta, word, wires=list(wires))
+    return circuit
+
+def make_device(num_qubits):
+    try:
+        return qml.device("lightning.qubit", wires=num_qubits), "adjoint"
+    except Exception:
+        return qml.device("default.qubit", wires=num_qubits), "best"
+
+# Grow the ansatz until the pool gradient norm drops below tol (or max_ops generators).
+# Returns the selected (word, wires) generators, their angles, the energy and the reference.
+def adapt_vqe(H, num_qubits, tol=1e-3, max_ops=40, max_steps=200, log=True):
+    dev, diff_method = make_device(num_qubits)
+    pool = operator_pool(num_qubits)
+    reference, energy = reference_state(H, num_qubits)
+    ops, params = [], np.array([], requires_grad=True)
+    if log:
+        print(f"Reference {''.join(map(str, reference))}: Energy = {energy:.6f}, pool of {len(pool)} generators")
+
+    while len(ops) < max_ops:
+        circuit = ansatz(reference, ops)
+        @qml.qnode(dev)
+        def state_circuit(params):
+            circuit(params)
+            return qml.state()
+        state = numpy.asarray(state_circuit(params)).reshape((2,) * num_qubits)
+
+        gradients = pool_gradients(state, H, pool)
+        norm = float(numpy.linalg.norm(gradients))
+        if norm < tol:
+            break
+        best = int(numpy.argmax(numpy.abs(gradients)))
+        ops.append(pool[best])
+
+        circuit = ansatz(reference, ops)
+        @qml.qnode(dev, diff_method=diff_method)
+        def cost(params):
+            circuit(params)
+            return qml.expval(H)
+        params = np.append(params, 0.0)
+        params, energy, steps = minimize(cost, np.array(params, requires_grad=True), max_steps=max_steps,
+                                         tol=1e-9, method="L-BFGS-B")
+        if log:
+            word, wires = pool[best]
+            print(f"Round {len(ops)}: add {word}{list(wires)} (|grad| {abs(gradients[best]):.4f}, "
+                  f"norm {norm:.4f}) -> Energy = {float(energy):.6f} ({steps} steps)")
+
+    return ops, params, float(energy), reference
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Adaptive compact ansatz for a molecule script's Hamiltonian")
+    parser.add_argument("script", help="molecule script, e.g. h/h2_excited_state.py")
+    parser.add_argument("--num-qubits", type=int, help="rebuild the Hamiltonian for this many qubits")
+    parser.add_argument("--tol", type=float, default=1e-3, help="stop when the pool gradient norm is below this")
+    parser.add_argument("--max-ops", type=int, default=40)
+    parser.add_argument("--exact", action="store_true", help="compare with exact diagonalization (small n)")
+    parser.add_argument("--out", help="save generators and angles to this .npz file")
+    args = parser.parse_args()
+
+    module = load_script(args.script)
+    if args.num_qubits:
+        # The builders read the module-level qubit count when called
+        module.num_qubits = args.num_qubits
+    H = getattr(module, hamiltonian_builder(module))()
+    num_qubits = module.num_qubits
+
+    start = time.perf_counter()
+    ops, params, energy, reference = adapt_vqe(H, num_qubits, tol=args.tol, max_ops=args.max_ops)
+    print(f"\n{num_qubits} qubits: Energy = {energy:.6f} with {len(params)} parameters "
+          f"(StatePrep would train {2**num_qubits} amplitudes) in {time.perf_counter() - start:.1f} s")
+    if args.exact:
+        matrix = qml.matrix(H, wire_order=range(num_qubits))
+        print(f"Exact ground energy = {numpy.linalg.eigvalsh(matrix)[0]:.6f}")
+    if args.out:
+        numpy.savez(args.out, words=[w for w, _ in ops], wires=numpy.array([list(w) + [-1] * (2 - len(w)) for _, w in ops]),
+                    params=numpy.asarray(params), reference=reference, energy=energy)
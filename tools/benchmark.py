@@ -0,0 +1,222 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import pennylane as qml
+from pennylane import numpy as np
+
+from loader import hamiltonian_builder, load_script
+from vqe import initial_params, minimize, scipy_methods
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Bump when the layout of the results file changes
+schema_version = 1
+
+# Drug-target models: qubit count and a factory returning (scoring function, arguments)
+drug_target_models = {
+    "drug-target/firstammonia.py": (4, lambda m: (m.nh3_circuit, [np.random.random(3 * m.num_qubits)])),
+    "drug-target/morphine/opioid-receptor.py": (8, lambda m: (m.binding_affinity, [
+        np.random.random(2 * m.num_qubits), np.random.random(4) * np.pi, np.random.random(4) * np.pi])),
+    "drug-target/2ammonia.py": (12, lambda m: (m.nh3_circuit, [np.random.random(9 * m.num_qubits)])),
+    "drug-target/application.py": (12, lambda m: (m.dti_circuit, [np.random.random(5 * m.num_qubits)])),
+    "drug-target/cancer/KRAS-mutations.py": (12, lambda m: (m.binding_affinity, [
+        np.random.random(4 * m.num_qubits), np.random.random(6) * np.pi, np.random.random(6) * np.pi])),
+    "drug-target/newtargetexistingdrugs/repurposing.py": (12, lambda m: (m.binding_affinity, [
+        np.random.random(36 * m.num_qubits), np.random.random(6) * np.pi, np.random.random(6) * np.pi])),
+    "drug-target/covid/SARS-CoV-2-main-protease.py": (16, lambda m: (m.dti_circuit, [
+        np.random.random(6 * m.num_qubits), np.random.random(8) * np.pi, np.random.random(8) * np.pi])),
+    "drug-target/3ammonia.py": (20, lambda m: (m.nh3_circuit, [np.random.random(11 * m.num_qubits)])),
+}
+
+# Molecule scripts with a StatePrep/RY circuit and a Hamiltonian builder, with their qubit counts
+def molecule_models():
+    models = {}
+    for path in sorted(glob.glob(os.path.join(repo_root, "h", "*.py")) + glob.glob(os.path.join(repo_root, "other", "*.py"))):
+        with open(path) as f:
+            source = f.read()
+        match = re.search(r"^num_qubits = (\d+)", source, re.M)
+        if match and "def circuit(" in source:
+            models[os.path.relpath(path, repo_root)] = int(match.group(1))
+    return models
+
+# Best-of-`repeat` wall time of fn() in seconds, then one traced call for peak Python/NumPy memory
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak / 2**20, result
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# Benchmark one molecule script: Hamiltonian build, forward, gradient and optimization to tolerance
+def bench_molecule(script, repeat, opt_steps, tol, method="adam"):
+    np.random.seed(0)
+    module = load_script(os.path.join(repo_root, script))
+    builder = getattr(module, hamiltonian_builder(module))
+    params = initial_params(module)
+
+    result = {"model": script, "kind": "molecule", "num_qubits": module.num_qubits}
+    result["build_s"], result["build_peak_mb"], _ = measure(builder, repeat)
+    result["forward_s"], result["forward_peak_mb"], _ = measure(lambda: module.circuit(params), repeat)
+    result["gradient_s"], result["gradient_peak_mb"], _ = measure(lambda: qml.grad(module.circuit)(params), repeat)
+    if opt_steps > 0:
+        start = time.perf_counter()
+        _, energy, steps = minimize(module.circuit, params, max_steps=opt_steps, tol=tol, method=method)
+        result["optimize_s"] = time.perf_counter() - start
+        result["optimize_steps"] = steps
+        result["energy"] = float(energy)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+# Benchmark one drug-target model's scoring throughput (evaluations per second)
+def bench_drug_target(script, repeat, evaluations):
+    np.random.seed(0)
+    module = load_script(os.path.join(repo_root, script))
+    score, args = drug_target_models[script][1](module)
+
+    result = {"model": script, "kind": "drug-target", "num_qubits": module.num_qubits}
+    for name in ("dti_hamiltonian", "nh3_hamiltonian"):
+        if hasattr(module, name):
+            result["build_s"], result["build_peak_mb"], _ = measure(getattr(module, name), repeat)
+    result["forward_s"], result["forward_peak_mb"], _ = measure(lambda: score(*args), repeat)
+    start = time.perf_counter()
+    for _ in range(evaluations):
+        score(*args)
+    result["score_per_s"] = evaluations / (time.perf_counter() - start)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo_root, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Metrics where larger is better; all other timing metrics regress when they grow
+higher_is_better = {"score_per_s"}
+compared_metrics = ("build_s", "forward_s", "gradient_s", "optimize_s", "score_per_s", "peak_rss_mb")
+
+# Compare two results files; returns the (model, metric, old, new, ratio) rows that regressed.
+# A model that failed in the current run (metric "error"), a baseline model in `models` that
+# the current run lacks (metric "missing") and a baseline metric the current row lacks count
+# as regressions too, with None for the values that do not exist. `models` defaults to every
+# model in the baseline.
+def compare(baseline, current, threshold, models=None):
+    old = {r["model"]: r for r in baseline["results"]}
+    new = {r["model"]: r for r in current["results"]}
+    regressions = []
+    for model in sorted(old if models is None else set(models) & set(old)):
+        if model not in new:
+            regressions.append((model, "missing", None, None, None))
+    for row in current["results"]:
+        if "error" in row:
+            regressions.append((row["model"], "error", None, None, None))
+            continue
+        if row["model"] not in old:
+            continue
+        for metric in compared_metrics:
+            if metric not in old[row["model"]]:
+                continue
+            if metric not in row:
+                regressions.append((row["model"], metric, old[row["model"]][metric], None, None))
+                continue
+            before, after = old[row["model"]][metric], row[metric]
+            ratio = before / after if metric in higher_is_better else after / before
+            if ratio > threshold:
+                regressions.append((row["model"], metric, before, after, ratio))
+    return regressions
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every molecule and drug-target model")
+    parser.add_argument("--only", help="regular expression selecting model paths")
+    parser.add_argument("--min-qubits", type=int, default=0)
+    parser.add_argument("--max-qubits", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--opt-steps", type=int, default=200, help="0 skips the optimization benchmark")
+    parser.add_argument("--tol", type=float, default=1e-6)
+    parser.add_argument("--method", default="adam", choices=("adam",) + scipy_methods, help="optimizer for the optimization benchmark")
+    parser.add_argument("--evaluations", type=int, default=20, help="scoring calls per drug-target model")
+    parser.add_argument("--out", help="results file (default benchmarks/results-<timestamp>.json)")
+    parser.add_argument("--compare", help="baseline results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.2, help="allowed slowdown ratio")
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Each model runs in its own process so peak RSS and caches are per model
+    if args.single:
+        if args.single in drug_target_models:
+            row = bench_drug_target(args.single, args.repeat, args.evaluations)
+        else:
+            row = bench_molecule(args.single, args.repeat, args.opt_steps, args.tol, args.method)
+        print(json.dumps(row))
+        sys.exit(0)
+
+    models = {**molecule_models(), **{k: v[0] for k, v in drug_target_models.items()}}
+    selected = [m for m, n in sorted(models.items(), key=lambda item: (item[1], item[0]))
+                if args.min_qubits <= n <= args.max_qubits and (not args.only or re.search(args.only, m))]
+
+    results = []
+    for model in selected:
+        print(f"Benchmarking {model} ({models[model]} qubits)")
+        command = [sys.executable, os.path.abspath(__file__), "--single", model, "--repeat", str(args.repeat),
+                   "--opt-steps", str(args.opt_steps), "--tol", str(args.tol), "--evaluations", str(args.evaluations),
+                   "--method", args.method]
+        proc = subprocess.run(command, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"  failed: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}")
+            results.append({"model": model, "num_qubits": models[model], "error": proc.stderr.strip()[-2000:]})
+            continue
+        row = json.loads(proc.stdout.strip().splitlines()[-1])
+        print("  " + ", ".join(f"{k}={v:.4g}" for k, v in row.items() if isinstance(v, float)))
+        results.append(row)
+
+    report = {
+        "schema_version": schema_version,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "pennylane": qml.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "settings": {"repeat": args.repeat, "opt_steps": args.opt_steps, "tol": args.tol, "method": args.method,
+                     "evaluations": args.evaluations},
+        "results": results,
+    }
+    out = args.out or os.path.join("benchmarks", f"results-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    if os.path.dirname(out):
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"Results written to {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.threshold, selected)
+        for model, metric, before, after, ratio in regressions:
+            if metric == "error":
+                print(f"REGRESSION {model}: failed in this run")
+            elif metric == "missing":
+                print(f"REGRESSION {model}: in the baseline but not in this run")
+            elif after is None:
+                print(f"REGRESSION {model} {metric}: {before:.4g} in the baseline, not measured in this run")
+            else:
+                print(f"REGRESSION {model} {metric}: {before:.4g} -> {after:.4g} ({ratio:.2f}x)")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,247 @@
+import argparse
+import inspect
+import os
+
+import numpy
+import pennylane as qml
+from pennylane import numpy as np
+
+from benchmark import drug_target_models, repo_root
+from loader import load_script
+from tune import tuned_loop, tuned_optimizer
+from vqe import initial_params
+
+# Hyperparameters restored alongside the optimizer class
+optimizer_settings = ("stepsize", "beta1", "beta2", "eps", "momentum", "decay", "lam")
+
+# Flatten an optimizer into named arrays: class, hyperparameters and its accumulators
+# (Adam keeps {"fm": [...], "sm": [...], "t": n}; Momentum/Adagrad/RMSProp keep a list)
+def optimizer_arrays(opt):
+    arrays = {"opt.class": type(opt).__name__}
+    for name in optimizer_settings:
+        if hasattr(opt, name):
+            arrays[f"opt.{name}"] = getattr(opt, name)
+    
+    accumulation = getattr(opt, "accumulation", None)
+    if isinstance(accumulation, dict):
+        arrays["acc.kind"] = "dict"
+        for key, value in accumulation.items():
+            if isinstance(value, list):
+                for i, item in enumerate(value):
+                    arrays[f"acc.{key}.{i}"] = item
+            else:
+                arrays[f"acc.{key}"] = value
+    elif isinstance(accumulation, list):
+        arrays["acc.kind"] = "list"
+        for i, item in enumerate(accumulation):
+            arrays[f"acc.{i}"] = item
+    else:
+        arrays["acc.kind"] = "none"
+    return arrays
+
+def unpack(value):
+    value = numpy.asarray(value)
+    return value.item() if value.ndim == 0 else value
+
+# Rebuild an optimizer, including its moment estimates, from optimizer_arrays output
+def restore_optimizer(data):
+    opt = getattr(qml, str(data["opt.class"]))()
+    for name in optimizer_settings:
+        if f"opt.{name}" in data:
+            setattr(opt, name, unpack(data[f"opt.{name}"]))
+    
+    kind = str(data["acc.kind"])
+    if kind == "dict":
+        accumulation = {}
+        for key in sorted(k for k in data if k.startswith("acc.") and k != "acc.kind"):
+            parts = key.split(".")
+            if len(parts) == 3:
+                accumulation.setdefault(parts[1], {})[int(parts[2])] = unpack(data[key])
+            else:
+                accumulation[parts[1]] = unpack(data[key])
+        opt.accumulation = {k: [v[i] for i in range(len(v))] if isinstance(v, dict) else v
+                            for k, v in accumulation.items()}
+    elif kind == "list":
+        items = {int(k.split(".")[1]): unpack(data[k]) for k in data if k.startswith("acc.") and k != "acc.kind"}
+        opt.accumulation = [items[i] for i in range(len(items))]
+    return opt
+
+# Write parameters, optimizer state, global RNG state, loop index and any extra values to a
+# compressed .npz. The file is written under a temporary name, synced and renamed into place,
+# so a preempted worker leaves either the previous checkpoint or the new one, never half of one.
+# The directory is synced after the rename so that the rename itself survives a crash.
+def save_checkpoint(path, step, params, opt, extra=None):
+    rng = numpy.random.get_state()
+    arrays = {
+        "step": step,
+        "params": numpy.asarray(params),
+        "rng.keys": rng[1], "rng.pos": rng[2], "rng.has_gauss": rng[3], "rng.gauss": rng[4],
+    }
+    arrays.update(optimizer_arrays(opt))
+    for key, value in (extra or {}).items():
+        arrays[f"extra.{key}"] = value
+    
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        numpy.savez_compressed(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+# Load a checkpoint, restore the global RNG state and return (step, params, optimizer, extra)
+def load_checkpoint(path):
+    with numpy.load(path) as f:
+        data = {key: f[key] for key in f.files}
+    numpy.random.set_state(("MT19937", data["rng.keys"], int(data["rng.pos"]),
+                            int(data["rng.has_gauss"]), float(data["rng.gauss"])))
+    params = np.array(data["params"], requires_grad=True)
+    extra = {key[len("extra."):]: unpack(value) for key, value in data.items() if key.startswith("extra.")}
+    return int(data["step"]), params, restore_optimizer(data), extra
+
+# Callback for the find_ground_state / vqe_optimize loops: checkpoint every `every` steps
+def checkpoint_callback(path, every=10):
+    def callback(step, params, opt):
+        if step % every == 0:
+            save_checkpoint(path, step, params, opt)
+    return callback
+
+# Callback for simulate_drug_repurposing: also records the target index and affinities so far
+def repurposing_checkpoint_callback(path, every=10):
+    def callback(state):
+        if state["step"] % every == 0:
+            names = [name for name, _ in state["affinities"]]
+            values = [float(value) for _, value in state["affinities"]]
+            save_checkpoint(path, state["step"], state["params"], state["opt"],
+                            {"target_index": state["target_index"], "names": numpy.array(names, dtype=str),
+                             "values": numpy.array(values, dtype=float)})
+    return callback
+
+# Resume state for simulate_drug_repurposing from a repurposing checkpoint, or None
+def repurposing_resume(path):
+    if not os.path.exists(path):
+        return None
+    step, params, opt, extra = load_checkpoint(path)
+    names, values = numpy.atleast_1d(extra["names"]), numpy.atleast_1d(extra["values"])
+    return {"target_index": int(extra["target_index"]), "step": step, "params": params, "opt": opt,
+            "affinities": [(str(n), float(v)) for n, v in zip(names, values)]}
+
+# Run a molecule script's ground and excited state search with periodic checkpoints of the
+# ground-state loop; rerunning the same command after preemption resumes where it stopped.
+# With tuned=True the ground-state loop uses the optimizer and step count from tools/tune.py.
+def run_with_checkpoints(script, path, every=10, seed=0, tuned=False):
+    module = load_script(script)
+    opt, steps = tuned_optimizer(script) if tuned else (None, None)
+    if tuned and opt is None:
+        print(f"No tuned settings for {script}, using the script's own")
+    if os.path.exists(path):
+        step, params, opt, _ = load_checkpoint(path)
+        print(f"Resuming from step {step}")
+    else:
+        numpy.random.seed(seed)
+        step, params = 0, initial_params(module)
+    
+    print("Finding ground state...")
+    kwargs = {} if steps is None else {"steps": steps}
+    ground_params, ground_energy = module.find_ground_state(params, opt=opt, start=step,
+                                                            callback=checkpoint_callback(path, every), **kwargs)
+    print(f"Ground state energy: {ground_energy:.6f}")
+    
+    print("\nFinding first excited state...")
+    excited_params, excited_energy = module.find_excited_state(ground_params)
+    print(f"First excited state energy: {excited_energy:.6f}")
+    print(f"\nExcitation energy: {excited_energy - ground_energy:.6f}")
+    return ground_energy, excited_energy
+
+# Run a drug-target script's optimization loop (vqe_optimize, KRAS optimize_drug or opioid
+# optimize_interaction) with periodic checkpoints. The feature arguments are drawn from `seed`
+# on every run, so a resumed run scores the same drug and target; the checkpoint then restores
+# the RNG state where the loop stopped (KRAS draws its drug candidates from it). With
+# tuned=True the loop uses the optimizer and step count from tools/tune.py.
+def run_drug_target_with_checkpoints(script, path, every=10, seed=0, steps=None, tuned=False):
+    script = os.path.relpath(os.path.abspath(script), repo_root)
+    module = load_script(os.path.join(repo_root, script))
+    loop = tuned_loop(module) if script in drug_target_models else None
+    if loop not in ("vqe_optimize", "optimize_drug", "optimize_interaction"):
+        raise ValueError(f"{script} has no drug-target optimization loop to checkpoint")
+    opt, tuned_steps = tuned_optimizer(script) if tuned else (None, None)
+    if tuned and opt is None:
+        print(f"No tuned settings for {script}, using the script's own")
+    steps = steps or tuned_steps
+    numpy.random.seed(seed)
+    score, args = drug_target_models[script][1](module)
+    step, params = 0, args[0]
+    if os.path.exists(path):
+        step, params, opt, _ = load_checkpoint(path)
+        print(f"Resuming from step {step}")
+    
+    callback = checkpoint_callback(path, every)
+    kwargs = {} if steps is None else {"steps": steps}
+    if loop == "vqe_optimize":
+        # SARS-CoV-2 Mpro takes the drug and protein features after the parameters
+        features = args[1:] if "drug_features" in inspect.signature(module.vqe_optimize).parameters else []
+        params, _ = module.vqe_optimize(score, params, *features, opt=opt, start=step, callback=callback, **kwargs)
+        print(f"Final interaction energy = {score(params, *args[1:]):.6f}")
+        return params
+    if loop == "optimize_drug":
+        params, drug_features = module.optimize_drug(params, module.kras_features, opt=opt, start=step,
+                                                     callback=callback, **kwargs)
+        if drug_features is not None:
+            print(f"Final binding affinity = {module.binding_affinity(params, drug_features, module.kras_features):.6f}")
+        return params
+    # The opioid loop draws its own start parameters (seed 42) unless it resumes
+    params = module.optimize_interaction(opt=opt, start=step, callback=callback,
+                                         init_params=params if step else None, **kwargs)
+    print(f"Final binding affinity = {module.binding_affinity(params, module.morphine_features, module.mor_features):.6f}")
+    return params
+
+# Run the Sildenafil repurposing simulation with periodic checkpoints; rerunning the same
+# command after preemption resumes at the target and step where it stopped. With tuned=True
+# the targets are trained with the optimizer and step count from tools/tune.py.
+def run_repurposing_with_checkpoints(path, every=10, steps=None, tuned=False):
+    script = os.path.join("drug-target", "newtargetexistingdrugs", "repurposing.py")
+    module = load_script(os.path.join(repo_root, script))
+    opt, tuned_steps = tuned_optimizer(script) if tuned else (None, None)
+    if tuned and opt is None:
+        print(f"No tuned settings for {script}, using the script's own")
+    resume = repurposing_resume(path)
+    if resume is not None:
+        print(f"Resuming target {resume['target_index'] + 1} at step {resume['step']}")
+    affinities = module.simulate_drug_repurposing(module.sildenafil_features, module.targets,
+                                                  steps or tuned_steps or 300, resume=resume, opt=opt,
+                                                  callback=repurposing_checkpoint_callback(path, every))
+    
+    print("\nRanked potential targets:")
+    for i, (name, affinity) in enumerate(sorted(affinities, key=lambda x: x[1], reverse=True), 1):
+        print(f"{i}. {name}: {affinity:.6f}")
+    return affinities
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checkpointed runs that can resume after preemption")
+    commands = parser.add_subparsers(dest="command", required=True)
+    molecule = commands.add_parser("molecule", help="ground and excited state search of a molecule script")
+    molecule.add_argument("script", help="molecule script, e.g. h/h10_excited_state.py")
+    drug_target = commands.add_parser("drug-target", help="optimization loop of a drug-target script")
+    drug_target.add_argument("script", help="drug-target script, e.g. drug-target/application.py")
+    drug_target.add_argument("--steps", type=int, help="default: the tuned or the script's own step count")
+    repurposing = commands.add_parser("repurposing", help="Sildenafil repurposing simulation")
+    repurposing.add_argument("--steps", type=int, help="steps per target (default: tuned, or 300)")
+    for command in (molecule, drug_target, repurposing):
+        command.add_argument("--checkpoint", required=True, help="checkpoint file (.npz)")
+        command.add_argument("--every", type=int, default=10, help="checkpoint interval in steps")
+        command.add_argument("--tuned", action="store_true", help="use the settings saved by tools/tune.py")
+    for command in (molecule, drug_target):
+        command.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    if args.command == "molecule":
+        run_with_checkpoints(args.script, args.checkpoint, args.every, args.seed, args.tuned)
+    elif args.command == "drug-target":
+        run_drug_target_with_checkpoints(args.script, args.checkpoint, args.every, args.seed, args.steps, args.tuned)
+    else:
+        run_repurposing_with_checkpoints(args.checkpoint, args.every, args.steps, args.tuned)
@@ -0,0 +1,135 @@
+import argparse
+import time
+
+import numpy
+import pennylane as qml
+import scipy.sparse.linalg
+from pennylane import numpy as np
+
+from loader import hamiltonian_builder, load_script
+from subspace import pauli_gathers, word_masks
+from vqe import minimize, random_state
+
+# Eigenstates near a target energy lambda instead of the lowest ones. The variational path
+# minimizes the folded spectrum <(H - lambda)^2> = <H^2> - 2 lambda <H> + lambda^2 over the
+# script's circuit. The minimum is the eigenstate closest to lambda. One H|psi> per
+# evaluation gives both <H> = <psi|H psi> and <H^2> = <H psi|H psi>. Further states near
+# lambda are found by penalizing overlap with the ones already found. The exact path is
+# shift-invert Lanczos (eigsh with sigma = lambda) on the sparse Hamiltonian. It converges
+# to the eigenvalues nearest lambda first, so a window is covered without the states
+# below it.
+
+# H as a gather: (H psi)[i] = sum_k weights[i, k] psi[source[i, k]], one column per Pauli
+# term. Built once per Hamiltonian; indexing and the weighted sum stay differentiable.
+def pauli_gather(H, num_qubits):
+    words = list(qml.pauli.pauli_sentence(H).items())
+    source, phases = pauli_gathers(2 ** num_qubits, [word_masks(word, num_qubits) for word, _ in words])
+    return source, phases * numpy.array([complex(c) for _, c in words])
+
+def apply_gather(gather, psi):
+    source, weights = gather
+    return np.sum(psi[source] * weights, axis=1)
+
+# The statevector QNode of a script's energy circuit: the same gates, measured with qml.state()
+def state_qnode(circuit):
+    @qml.qnode(circuit.device)
+    def state(params):
+        for op in qml.tape.make_qscript(circuit.func)(params).operations:
+            qml.apply(op)
+        return qml.state()
+    return state
+
+# Energy, <H^2> and the squared overlaps with `found` states of the normalized circuit state
+def moments(state, gather, params, found=()):
+    psi = state(params)
+    h_psi = apply_gather(gather, psi)
+    norm = np.real(np.sum(np.conj(psi) * psi))
+    energy = np.real(np.sum(np.conj(psi) * h_psi)) / norm
+    square = np.real(np.sum(np.conj(h_psi) * h_psi)) / norm
+    overlaps = [np.abs(np.sum(np.conj(phi) * psi)) ** 2 / norm for phi in found]
+    return energy, square, overlaps
+
+# Folded-spectrum cost with a penalty of `penalty` per unit overlap with the found states
+def folded_cost(state, gather, target, found=(), penalty=10.0):
+    def cost(params):
+        energy, square, overlaps = moments(state, gather, params, found)
+        return square - 2 * target * energy + target ** 2 + penalty * sum(overlaps)
+    return cost
+
+# Up to `count` states closest to `target`, each started from a fresh random state. Stops
+# early once a state's energy leaves [low, high]. Returns (energy, variance, steps) per state.
+def targeted_states(module, target, count=1, window=None, penalty=10.0, max_steps=200, method="L-BFGS-B", log=True):
+    state = state_qnode(module.circuit)
+    gather = pauli_gather(module.H, module.num_qubits)
+    found, results = [], []
+    for k in range(count):
+        cost = folded_cost(state, gather, target, found, penalty)
+        params, _, steps = minimize(cost, random_state(module.num_qubits), max_steps=max_steps, tol=1e-10,
+                                    method=method)
+        energy, square, _ = moments(state, gather, params)
+        energy, variance = float(energy), float(square - energy ** 2)
+        if log:
+            print(f"State {k + 1}: Energy = {energy:.6f}, variance {variance:.2e} ({steps} steps)")
+        if window is not None and not window[0] <= energy <= window[1]:
+            break
+        psi = state(params)
+        found.append(psi / np.sqrt(np.real(np.sum(np.conj(psi) * psi))))
+        results.append((energy, variance, steps))
+    return results
+
+# Exact eigenvalues in [low, high] by shift-invert Lanczos around the window's center. k is
+# doubled until the farthest eigenvalue returned lies outside the window, so every eigenvalue
+# inside it has been found, or until max_count; then the max_count nearest the center are
+# returned. Returns the eigenvalues and whether the window was covered.
+def window_eigenvalues(H, num_qubits, low, high, k=4, max_count=64):
+    sparse = H.sparse_matrix(wire_order=range(num_qubits)).tocsc()
+    center = (low + high) / 2
+    k_max = min(max_count, sparse.shape[0] - 2)
+    while True:
+        k = min(k, k_max)
+        values = scipy.sparse.linalg.eigsh(sparse, k=k, sigma=center, which="LM", return_eigenvectors=False)
+        covered = numpy.max(numpy.abs(values - center)) > (high - low) / 2
+        if covered or k == k_max:
+            return numpy.sort(values[(values >= low) & (values <= high)]), covered
+        k *= 2
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Eigenstates of a molecule script near a target energy")
+    parser.add_argument("script", nargs="?", default="other/o3_excited_state.py")
+    parser.add_argument("--target", type=float, help="energy lambda to fold around (default: window center)")
+    parser.add_argument("--window", type=float, nargs=2, metavar=("LOW", "HIGH"), help="energy window")
+    parser.add_argument("--states", type=int, default=1, help="states to find variationally")
+    parser.add_argument("--penalty", type=float, default=10.0, help="overlap penalty for found states")
+    parser.add_argument("--max-steps", type=int, default=200)
+    parser.add_argument("--method", default="L-BFGS-B", help="'adam' or a SciPy method from vqe.scipy_methods")
+    parser.add_argument("--exact", action="store_true", help="shift-invert Lanczos on the sparse Hamiltonian")
+    parser.add_argument("--exact-only", action="store_true", help="skip the variational search")
+    parser.add_argument("--max-eigenvalues", type=int, default=64, help="cap on exact eigenvalues in a window")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.target is None and args.window is None:
+        parser.error("give --target or --window")
+
+    np.random.seed(args.seed)
+    module = load_script(args.script)
+    if not hasattr(module, "H"):
+        module.H = getattr(module, hamiltonian_builder(module))()
+    target = args.target if args.target is not None else sum(args.window) / 2
+
+    if not args.exact_only:
+        start = time.perf_counter()
+        targeted_states(module, target, args.states, args.window, args.penalty, args.max_steps, args.method)
+        print(f"Variational search around {target:.6f} took {time.perf_counter() - start:.1f} s")
+    if args.exact or args.exact_only:
+        start, covered = time.perf_counter(), True
+        if args.window:
+            values, covered = window_eigenvalues(module.H, module.num_qubits, *args.window,
+                                                 max_count=args.max_eigenvalues)
+        else:
+            sparse = module.H.sparse_matrix(wire_order=range(module.num_qubits)).tocsc()
+            values = numpy.sort(scipy.sparse.linalg.eigsh(sparse, k=max(args.states, 1), sigma=target, which="LM",
+                                                          return_eigenvectors=False))
+        print(f"Shift-invert Lanczos: {len(values)} eigenvalues in {time.perf_counter() - start:.2f} s: "
+              + ", ".join(f"{e:.6f}" for e in values)
+              + ("" if covered else f" (the {len(values)} nearest {target:.6f}; the window holds more)"))
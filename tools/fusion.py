@@ -0,0 +1,193 @@
+import argparse
+import os
+import time
+
+import numpy
+import pennylane as qml
+import scipy.sparse
+from autograd.extend import defvjp, primitive
+from pennylane import numpy as np
+from pennylane.devices.qubit import apply_operation
+
+from benchmark import drug_target_models, repo_root
+from loader import load_script
+from vqe import initial_params
+
+# Gate-fusion pass for the default.qubit circuits:
+# - Each run of single-qubit gates on a wire becomes one 2x2 QubitUnitary. Its matrix is the
+#   product of the gates' matrices, so autograd differentiates through it.
+# - Each run of CNOTs becomes one BasisPermutation, a single index gather of the state.
+# The fusion plan depends only on the gate names and wires, so it is built once per circuit
+# structure and cached; later calls only multiply the new 2x2 matrices.
+# Importing this module registers the BasisPermutation handler with default.qubit's
+# apply_operation dispatcher. The registration happens once and holds for the whole process.
+
+class BasisPermutation(qml.operation.Operation):
+    """Permutation of the computational basis: new_state[i] = state[permutation[i]]."""
+
+    num_params = 0
+    grad_method = None
+
+    def __init__(self, permutation, wires, inverse=None, id=None):
+        inverse = numpy.argsort(permutation) if inverse is None else inverse
+        self._hyperparameters = {"permutation": permutation, "inverse": inverse}
+        super().__init__(wires=wires, id=id)
+
+    @staticmethod
+    def compute_sparse_matrix(permutation, **kwargs):
+        n = len(permutation)
+        return scipy.sparse.csr_matrix((numpy.ones(n), (numpy.arange(n), permutation)), shape=(n, n))
+
+# Gather along the last axis. Autograd's gradient of plain indexing scatters with add.at, which
+# costs more than the whole forward gather; the gradient of a permutation is the gather by
+# its inverse.
+@primitive
+def permute(state, permutation, inverse):
+    return state[..., permutation]
+
+defvjp(permute, lambda ans, state, permutation, inverse: lambda g: permute(g, inverse, permutation))
+
+@apply_operation.register
+def apply_basis_permutation(op: BasisPermutation, state, is_state_batched: bool = False, debugger=None, **_):
+    shape = qml.math.shape(state)
+    flat = qml.math.reshape(state, (shape[0], -1) if is_state_batched else (-1,))
+    if qml.math.get_interface(state) in ("autograd", "numpy"):
+        flat = permute(flat, op.hyperparameters["permutation"], op.hyperparameters["inverse"])
+    else:
+        flat = flat[..., op.hyperparameters["permutation"]]
+    return qml.math.reshape(flat, shape)
+
+# Basis permutation of a CNOT sequence over `wires` (PennyLane order, first wire most significant)
+def cnot_permutation(cnots, wires):
+    n = len(wires)
+    index = numpy.arange(2 ** n)
+    permutation = index.copy()
+    for op in cnots:
+        control, target = (n - 1 - wires.index(w) for w in op.wires)
+        permutation = permutation[index ^ (((index >> control) & 1) << target)]
+    return permutation
+
+def permutation_pair(cnots, wires):
+    permutation = cnot_permutation(cnots, wires)
+    return permutation, numpy.argsort(permutation)
+
+# Fusion plan for a gate sequence: a list of ("single", wire, op indices), ("cnots", op indices)
+# and ("op", index) steps. Single-qubit gates wait on their wire until another gate touches
+# it. A waiting gate commutes with everything issued since it was queued, so it can be issued
+# ahead of the open CNOT run, unless that run already touched its wire; then the run is
+# closed first. A lone CNOT stays a CNOT: one gather costs about as much as one CNOT, so
+# only runs of two or more save work.
+def fusion_plan(ops):
+    plan, pending, run, run_wires = [], {}, [], set()
+
+    def close_run():
+        nonlocal run, run_wires
+        if len(run) == 1:
+            plan.append(("op", run[0]))
+        elif run:
+            plan.append(("cnots", run))
+        run, run_wires = [], set()
+
+    def flush(wires):
+        for w in wires:
+            if w in pending:
+                if w in run_wires:
+                    close_run()
+                plan.append(("single", w, pending.pop(w)))
+
+    for i, op in enumerate(ops):
+        if len(op.wires) == 1 and op.has_matrix and not isinstance(op, qml.operation.StatePrepBase):
+            pending.setdefault(op.wires[0], []).append(i)
+        elif op.name == "CNOT":
+            flush(op.wires)
+            run.append(i)
+            run_wires.update(op.wires)
+        else:
+            flush(op.wires)
+            close_run()
+            plan.append(("op", i))
+    close_run()
+    flush(list(pending))
+    return plan
+
+plan_cache = {}
+
+def structure(ops):
+    return tuple((op.name, tuple(op.wires)) for op in ops)
+
+def fuse_ops(ops, wires):
+    key = (structure(ops), tuple(wires))
+    if key not in plan_cache:
+        plan = fusion_plan(ops)
+        plan_cache[key] = [step + permutation_pair([ops[i] for i in step[1]], list(wires))
+                           if step[0] == "cnots" else step for step in plan]
+    fused = []
+    for step in plan_cache[key]:
+        if step[0] == "op":
+            fused.append(ops[step[1]])
+        elif step[0] == "cnots":
+            fused.append(BasisPermutation(step[2], wires=wires, inverse=step[3]))
+        elif len(step[2]) == 1:
+            fused.append(ops[step[2][0]])
+        else:
+            matrix = qml.matrix(ops[step[2][0]])
+            for i in step[2][1:]:
+                matrix = qml.math.dot(qml.matrix(ops[i]), matrix)
+            fused.append(qml.QubitUnitary(matrix, wires=step[1], unitary_check=False))
+    return fused
+
+@qml.transform
+def fuse_gates(tape):
+    wires = tape.wires
+    fused = qml.tape.QuantumScript(fuse_ops(tape.operations, wires), tape.measurements, shots=tape.shots,
+                                   trainable_params=None)
+    return [fused], lambda results: results[0]
+
+# Replace a loaded script's module-level QNodes with fused versions
+def fuse_module(module):
+    for name, value in list(vars(module).items()):
+        if isinstance(value, qml.QNode) and not getattr(value, "fused", False):
+            fused = fuse_gates(value)
+            fused.fused = True
+            setattr(module, name, fused)
+
+def gate_count(qnode, *args):
+    return len(qml.workflow.construct_tape(qnode)(*args).operations)
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare a script's circuit with and without gate fusion")
+    parser.add_argument("script", nargs="?", default="drug-target/3ammonia.py")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-gradient", action="store_true", help="time the forward pass only (backprop of a "
+                        "20-qubit circuit keeps every intermediate state in memory)")
+    args = parser.parse_args()
+
+    np.random.seed(args.seed)
+    script = os.path.relpath(os.path.abspath(args.script), repo_root)
+    module = load_script(os.path.join(repo_root, script))
+    if script in drug_target_models:
+        qnode, circuit_args = drug_target_models[script][1](module)
+    else:
+        qnode, circuit_args = module.circuit, [initial_params(module)]
+    fused = fuse_gates(qnode)
+
+    print(f"{script}: {gate_count(qnode, *circuit_args)} gates -> {gate_count(fused, *circuit_args)} after fusion")
+    for name, circuit in (("original", qnode), ("fused", fused)):
+        timings = {}
+        phases = [("forward", lambda: circuit(*circuit_args))]
+        if not args.no_gradient:
+            phases.append(("gradient", lambda: qml.grad(circuit, argnums=0)(*circuit_args)))
+        for phase, fn in phases:
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                value = fn()
+                times.append(time.perf_counter() - start)
+            timings[phase] = (min(times), value)
+        line = f"{name:8s} forward {timings['forward'][0] * 1e3:8.1f} ms, energy {float(timings['forward'][1]):.10f}"
+        if "gradient" in timings:
+            seconds, gradient = timings["gradient"]
+            line += f", gradient {seconds * 1e3:8.1f} ms, |grad| {float(np.linalg.norm(gradient)):.10f}"
+        print(line)
@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import runpy
+import socket
+import socketserver
+import sys
+import tempfile
+import time
+import traceback
+
+# Lightweight launcher for the molecule and drug-target scripts. Only the standard library is
+# imported here: pennylane (~1.2 s, mostly scipy via pennylane.transforms) is loaded once by a
+# warm server, and each job runs in a forked copy of it, so starting a small job costs a fork.
+#   python tools/launch.py serve &
+#   python tools/launch.py run drug-target/firstammonia.py
+# Without a running server `run` falls back to running the script in this process.
+default_socket = os.path.join(tempfile.gettempdir(), f"quantum-launch-{os.getuid()}.sock")
+
+# Marker that ends a job's output and carries its exit code. It follows the job's last output
+# directly, so it lands mid-line when that output does not end with a newline.
+exit_marker = "\0exit "
+
+# Plotting is optional in every script (`import matplotlib.pyplot` inside try/except ImportError),
+# so hiding matplotlib skips the plots without importing it
+def block_plotting():
+    for name in ("matplotlib", "matplotlib.pyplot"):
+        sys.modules[name] = None
+
+# Run a script as __main__ the way `python script args...` would; returns the exit code
+def run_script(script, argv=(), plot=False):
+    if not plot:
+        block_plotting()
+    script = os.path.abspath(script)
+    sys.argv = [script] + list(argv)
+    sys.path.insert(0, os.path.dirname(script))
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except Exception:
+        traceback.print_exc()
+        return 1
+    return 0
+
+# Import what every job needs once, before forking. Devices are not built here: each script
+# builds its own, and after preloading that only costs a few milliseconds
+def preload():
+    import pennylane as qml
+    from pennylane import numpy as np  # noqa: F401
+
+    for name in ("default.qubit", "lightning.qubit"):
+        try:
+            qml.device(name, wires=1)
+        except Exception:
+            pass
+
+class JobHandler(socketserver.StreamRequestHandler):
+    # Runs in the forked child: stdout/stderr go back over the connection
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        fd = self.connection.fileno()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(fd, 1)
+        os.dup2(fd, 2)
+        sys.stdout = os.fdopen(1, "w", buffering=1, closefd=False)
+        sys.stderr = os.fdopen(2, "w", buffering=1, closefd=False)
+        os.chdir(request["cwd"])
+        os.environ.update(request.get("env", {}))
+        code = run_script(request["script"], request["argv"], request["plot"])
+        sys.stdout.flush()
+        sys.stderr.flush()
+        sys.stdout.write(f"{exit_marker}{code}\n")
+        sys.stdout.flush()
+
+class LaunchServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    pass
+
+def serve(path):
+    start = time.perf_counter()
+    preload()
+    if os.path.exists(path):
+        os.unlink(path)
+    with LaunchServer(path, JobHandler) as server:
+        print(f"Preloaded in {time.perf_counter() - start:.2f} s, listening on {path}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
+
+# Send one job to the server and stream its output; returns the exit code, or None when no
+# server is listening
+def submit(path, script, argv, plot):
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+    except OSError:
+        return None
+    request = {"script": os.path.abspath(script), "argv": argv, "plot": plot, "cwd": os.getcwd(),
+               "env": {k: v for k, v in os.environ.items() if k.startswith("QUANTUM_")}}
+    with sock, sock.makefile("r") as stream:
+        sock.sendall((json.dumps(request) + "\n").encode())
+        for line in stream:
+            output, marker, code = line.partition(exit_marker)
+            sys.stdout.write(output)
+            if marker:
+                sys.stdout.flush()
+                return int(code)
+            sys.stdout.flush()
+    return 1
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Start scripts quickly from a preloaded server")
+    parser.add_argument("--socket", default=os.environ.get("QUANTUM_LAUNCH_SOCKET", default_socket))
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("serve", help="preload pennylane and serve jobs")
+    run = commands.add_parser("run", help="run a script through the server")
+    run.add_argument("script", help="script to run, e.g. drug-target/firstammonia.py")
+    run.add_argument("--plot", action="store_true", help="load matplotlib and show the plots")
+    run.add_argument("--local", action="store_true", help="run in this process, without the server")
+    run.add_argument("argv", nargs=argparse.REMAINDER, help="arguments passed to the script")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.socket)
+        sys.exit(0)
+
+    argv = args.argv[1:] if args.argv[:1] == ["--"] else args.argv
+    code = None if args.local else submit(args.socket, args.script, argv, args.plot)
+    if code is None:
+        code = run_script(args.script, argv, args.plot)
+    sys.exit(code)
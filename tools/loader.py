@@ -0,0 +1,45 @@
+import ast
+import importlib.util
+import os
+import re
+
+import profiling
+
+# Scripts are cached per process so that repeated loads share one device and Hamiltonian
+loaded_scripts = {}
+
+# Load a molecule or drug-target script as a module. Names such as "h3+_excited_state.py"
+# or "KRAS-mutations.py" are not importable, so the script is loaded from its path instead.
+def load_script(path):
+    path = os.path.abspath(path)
+    if path not in loaded_scripts:
+        name = "script_" + re.sub(r"\W", "_", os.path.splitext(os.path.basename(path))[0])
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        if profiling.enabled:
+            profiling.exec_module(module, path)
+        else:
+            spec.loader.exec_module(module)
+        loaded_scripts[path] = module
+    return loaded_scripts[path]
+
+# Names of the Hamiltonian builders defined by a script; the scoring scripts (KRAS, opioid,
+# repurposing) define none
+def hamiltonian_builders(module):
+    return [name for name in vars(module) if name.endswith("_hamiltonian") and callable(getattr(module, name))]
+
+# Name of the Hamiltonian builder defined by a script, e.g. "h2_hamiltonian"
+def hamiltonian_builder(module):
+    names = hamiltonian_builders(module)
+    if len(names) != 1:
+        raise ValueError(f"Expected one *_hamiltonian builder in {module.__file__}, found {names}")
+    return names[0]
+
+# The body of a script's `if __name__ == "__main__":` block, compiled to run in the namespace
+# of the loaded module
+def main_code(script):
+    with open(script) as f:
+        tree = ast.parse(f.read(), script)
+    body = [statement for node in tree.body if isinstance(node, ast.If) and "__name__" in ast.unparse(node.test)
+            for statement in node.body]
+    return compile(ast.Module(body=body, type_ignores=[]), script, "exec")
@@ -0,0 +1,153 @@
+import argparse
+import contextlib
+import importlib
+import inspect
+import os
+import time
+
+import numpy
+import pennylane as qml
+from pennylane import numpy as np
+
+from benchmark import drug_target_models, repo_root
+from loader import load_script
+from precision import model_cost
+from tune import default_config, make_optimizer, maximized_models
+from vqe import initial_params
+
+# Multi-start optimization: R random restarts of a script's optimization evaluated as one
+# broadcast batch through its circuit. The optimizer steps on the sum of the R energies.
+# Each restart's gradient is its own, and Adam, momentum and gradient descent act elementwise,
+# so every restart follows exactly the path of a separate run. Restarts that are clearly
+# behind are dropped from the batch at each pruning point, together with their rows of the
+# optimizer state.
+
+# The circuits take either the whole parameter vector (StatePrep) or index it (params[i]).
+# StatePrep broadcasts over a leading batch axis; indexed gates need the batch axis last, so
+# that params[i] is the vector of R angles.
+def batch_last(module, script):
+    if script in drug_target_models:
+        return True
+    source = inspect.getsource(module.circuit.func)
+    return "StatePrep" not in source and "QubitStateVector" not in source
+
+# default.qubit applies gates to states of 13 or more axes (12 qubits plus the batch axis)
+# with tensordot. That path contracts a broadcast gate against a broadcast state as an outer
+# product over the two batch axes, which is wrong and grows the state R-fold per gate. The
+# einsum path pairs the batch axes, so it is used for every state size while the batch runs.
+# The switch is apply_operation.EINSUM_STATE_WIRECOUNT_PERF_THRESHOLD as of PennyLane 0.45; if
+# a later release drops it, the batch would silently take the tensordot path, so it fails here.
+apply_module = importlib.import_module("pennylane.devices.qubit.apply_operation")
+
+@contextlib.contextmanager
+def einsum_broadcasting():
+    if not hasattr(apply_module, "EINSUM_STATE_WIRECOUNT_PERF_THRESHOLD"):
+        raise RuntimeError(f"PennyLane {qml.__version__} has no apply_operation."
+                           "EINSUM_STATE_WIRECOUNT_PERF_THRESHOLD; batched restarts above 12 qubits need "
+                           "the einsum path it selects (written against PennyLane 0.45)")
+    threshold = apply_module.EINSUM_STATE_WIRECOUNT_PERF_THRESHOLD
+    apply_module.EINSUM_STATE_WIRECOUNT_PERF_THRESHOLD = 64
+    try:
+        yield
+    finally:
+        apply_module.EINSUM_STATE_WIRECOUNT_PERF_THRESHOLD = threshold
+
+# The energies of a batch of restarts (rows of `batch`) as one circuit call
+def batched_cost(cost, last):
+    return lambda batch: cost(batch.T if last else batch)
+
+# R start points: the model's own draw first, then fresh draws of the same kind. Drug-target
+# feature arguments stay fixed across restarts.
+def start_points(module, script, first, restarts):
+    starts = [first]
+    for _ in range(restarts - 1):
+        if script in drug_target_models:
+            starts.append(np.random.random(qml.math.shape(first)))
+        else:
+            starts.append(initial_params(module))
+    return np.array(np.stack(starts), requires_grad=True)
+
+# Keep only the rows `keep` of the optimizer's accumulators (Adam keeps {"fm": [...],
+# "sm": [...], "t": n}; momentum keeps a list)
+def select_restarts(opt, keep):
+    accumulation = getattr(opt, "accumulation", None)
+    if isinstance(accumulation, dict):
+        opt.accumulation = {k: [a[keep] for a in v] if isinstance(v, list) else v for k, v in accumulation.items()}
+    elif isinstance(accumulation, list):
+        opt.accumulation = [a[keep] for a in accumulation]
+
+# R restarts of a script's optimization with its own optimizer settings. Returns the best
+# params and energy, the final energy of every restart and the restart-evaluations.
+def multistart(module, script, restarts=8, steps=None, warmup=10, prune_every=10, margin=0.5, min_keep=1,
+               log=True):
+    config = default_config(module)
+    steps = steps or config["steps"] or 200
+    cost, first = model_cost(module, script)
+    sign = -1 if script in maximized_models else 1
+    energies_of = batched_cost(lambda p: sign * cost(p), batch_last(module, script))
+    batch = start_points(module, script, first, restarts)
+    with einsum_broadcasting():
+        return run_restarts(energies_of, batch, make_optimizer(config), steps, warmup, prune_every, margin,
+                            min_keep, sign, log)
+
+# The optimization loop over the batch. From step `warmup` on, every `prune_every` steps,
+# restarts worse than best + margin * (worst - best) are dropped, keeping at least
+# `min_keep`; a dropped restart's final energy is the one it was dropped with. `evaluated`
+# counts every restart-evaluation: the optimizer steps, the pruning points and the final one.
+def run_restarts(energies_of, batch, opt, steps, warmup, prune_every, margin, min_keep, sign, log):
+    alive = numpy.arange(len(batch))
+    final = numpy.full(len(batch), numpy.nan)
+    evaluated = 0
+    for i in range(steps):
+        batch = opt.step(lambda b: np.sum(energies_of(b)), batch)
+        evaluated += len(alive)
+        if i + 1 < warmup or (i + 1 - warmup) % prune_every or len(alive) <= min_keep:
+            continue
+        energies = numpy.asarray(energies_of(batch))
+        evaluated += len(alive)
+        best, worst = energies.min(), energies.max()
+        count = max(min_keep, int(numpy.sum(energies <= best + margin * (worst - best))))
+        keep = numpy.sort(numpy.argsort(energies)[:count])
+        if len(keep) < len(alive):
+            dropped = numpy.setdiff1d(numpy.arange(len(alive)), keep)
+            final[alive[dropped]] = sign * energies[dropped]
+            if log:
+                print(f"Step {i+1}: best {sign * best:.6f}, dropped {len(dropped)} of {len(alive)} restarts")
+            alive = alive[keep]
+            batch = np.array(batch[keep], requires_grad=True)
+            select_restarts(opt, keep)
+
+    energies = numpy.asarray(energies_of(batch))
+    evaluated += len(alive)
+    final[alive] = sign * energies
+    best = int(numpy.argmin(energies))
+    return batch[best], sign * float(energies[best]), final, evaluated
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batched random restarts of a script's optimization")
+    parser.add_argument("script", nargs="?", default="drug-target/application.py")
+    parser.add_argument("--restarts", type=int, default=8)
+    parser.add_argument("--steps", type=int, help="default: the script's own step count")
+    parser.add_argument("--warmup", type=int, default=10, help="steps before the first pruning")
+    parser.add_argument("--prune-every", type=int, default=10)
+    parser.add_argument("--margin", type=float, default=0.5, help="keep restarts within this fraction of the "
+                                                                   "best-to-worst spread of the best")
+    parser.add_argument("--no-prune", action="store_true")
+    parser.add_argument("--baseline", action="store_true", help="also time a single run for comparison")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    script = os.path.relpath(os.path.abspath(args.script), repo_root)
+    module = load_script(os.path.join(repo_root, script))
+    prune = {"warmup": 10 ** 9} if args.no_prune else {"warmup": args.warmup, "prune_every": args.prune_every,
+                                                       "margin": args.margin}
+    runs = [("single run", 1)] if args.baseline else []
+    runs.append((f"{args.restarts} restarts", args.restarts))
+    for name, restarts in runs:
+        np.random.seed(args.seed)
+        start = time.perf_counter()
+        params, energy, final, evaluated = multistart(module, script, restarts, args.steps, **prune)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: best {energy:.6f} in {elapsed:.1f} s ({evaluated} restart-evaluations); across restarts "
+              f"mean {numpy.mean(final):.6f}, std {numpy.std(final):.6f}, range [{final.min():.6f}, {final.max():.6f}]")
@@ -0,0 +1,149 @@
+import argparse
+import mmap
+import os
+import tempfile
+import time
+import types
+
+import numpy
+import pennylane as qml
+from pennylane import numpy as np
+
+from benchmark import drug_target_models, repo_root
+from loader import hamiltonian_builder, load_script
+from sharded import ShardedState, qnode_call, run_score, shard_command, script_model
+
+# Out-of-core statevector: the amplitudes live in a memory-mapped file, and the file is
+# processed as 2^(n-b) blocks of 2^b amplitudes. This is the planning of ShardedState with
+# blocks in place of worker processes. The b least significant physical qubits are local to
+# a block. A run of gates on them, or a batch of Pauli terms, is applied block after block
+# in one sequential pass over the file. A gate on a higher qubit first swaps it with a
+# local one; that pass reads and writes block pairs. Every command costs one pass, so the
+# run time is the pass count times the file size over the disk or page-cache bandwidth.
+
+dtypes = {"complex128": numpy.complex128, "complex64": numpy.complex64}
+
+class MappedState(ShardedState):
+    def __init__(self, num_qubits, block_qubits=20, directory=None, dtype="complex128"):
+        block_qubits = min(block_qubits, num_qubits)
+        if block_qubits < 2:
+            raise ValueError("blocks need at least two qubits")
+        self.num_qubits, self.workers = num_qubits, 2 ** (num_qubits - block_qubits)
+        self.globals = num_qubits - block_qubits
+        dtype = numpy.dtype(dtypes[dtype])
+        size = dtype.itemsize * 2 ** num_qubits
+
+        self.file = tempfile.NamedTemporaryFile(prefix="statevector-", suffix=".bin", dir=directory)
+        self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+        self.shards = numpy.ndarray((self.workers,) + (2,) * block_qubits, dtype=dtype, buffer=self.map)
+        self.flat = self.shards.reshape(-1)
+        self.passes = 0
+        self.reset()
+
+    def close(self):
+        del self.shards, self.flat
+        self.map.close()
+        self.file.close()
+
+    # One sequential pass over the blocks
+    def broadcast(self, *command):
+        self.passes += 1
+        return [shard_command(self.shards, rank, command[0], command[1:]) for rank in range(self.workers)]
+
+    @property
+    def nbytes(self):
+        return self.flat.nbytes
+
+    # Random normalized start state, written block by block (block i from seed + i), for the
+    # StatePrep circuits whose amplitude vector would not fit in memory
+    def random_state(self, seed=0):
+        self.layout = list(range(self.num_qubits))
+        norm = 0.0
+        for rank in range(self.workers):
+            rng = numpy.random.default_rng(seed + rank)
+            block = self.shards[rank].reshape(-1)
+            block[:] = rng.random(block.size) + 1j * rng.random(block.size)
+            norm += float(numpy.vdot(block, block).real)
+        for rank in range(self.workers):
+            self.shards[rank] *= 1 / numpy.sqrt(norm)
+        self.passes += 2
+
+# `qml` as seen by a circuit whose amplitude vector is deferred: StatePrep(None, wires) records
+# a Barrier in its place, any other StatePrep is the real one. StatePrep checks its 2^n
+# amplitudes when it is built, so it cannot be recorded with a placeholder state and
+# rewritten afterwards.
+class DeferringQml(types.SimpleNamespace):
+    def __getattr__(self, name):
+        return getattr(qml, name)
+
+    @staticmethod
+    def StatePrep(state, wires, **kwargs):
+        if state is None:
+            return qml.Barrier(wires=wires)
+        return qml.StatePrep(state, wires, **kwargs)
+
+# A QNode's gates and observable with a StatePrep of `None` left out, so that the 2^n
+# amplitudes are never built in memory. The circuit function runs on a copy of its globals
+# with `qml` replaced, so nothing shared is patched: other threads and later calls see the
+# real StatePrep, also when recording fails. Returns (whether a StatePrep was dropped,
+# gates, observable); a StatePrep of concrete amplitudes (a feature encoding) stays first.
+def deferred_tape(qnode, *args):
+    func = qnode.func
+    recorded = types.FunctionType(func.__code__, {**func.__globals__, "qml": DeferringQml()}, func.__name__,
+                                  func.__defaults__, func.__closure__)
+    tape = qml.tape.make_qscript(recorded)(*args)
+    ops = [qml.ops.functions.bind_new_parameters(op, [qml.math.to_numpy(d) for d in op.data]) for op in tape.operations]
+    deferred = bool(ops) and isinstance(ops[0], qml.Barrier)
+    return deferred, ops[1:] if deferred else ops, tape.measurements[0].obs
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate a script's energy with the statevector on disk")
+    parser.add_argument("script", nargs="?", default="h/h10_excited_state.py")
+    parser.add_argument("--num-qubits", type=int, help="rebuild the model for this many qubits")
+    parser.add_argument("--block-qubits", type=int, default=20, help="block size 2^b amplitudes")
+    parser.add_argument("--dir", help="directory for the state file (default: $TMPDIR)")
+    parser.add_argument("--dtype", choices=list(dtypes), default="complex128")
+    parser.add_argument("--reference", action="store_true", help="check against default.qubit (small n)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    np.random.seed(args.seed)
+    script = os.path.relpath(os.path.abspath(args.script), repo_root)
+    module = load_script(os.path.join(repo_root, script))
+    if args.num_qubits:
+        # The builders read the module-level qubit count when called
+        module.num_qubits = args.num_qubits
+        if hasattr(module, "H"):
+            module.H = getattr(module, hamiltonian_builder(module))()
+    num_qubits = module.num_qubits
+    # Molecule circuits only use their parameters in the StatePrep, which is deferred
+    score, circuit_args = script_model(module, script) if script in drug_target_models else (module.circuit, [None])
+    qnode, qnode_args = qnode_call(module, score, circuit_args)
+    deferred, ops, H = deferred_tape(qnode, *qnode_args)
+
+    with MappedState(num_qubits, args.block_qubits, args.dir, args.dtype) as engine:
+        print(f"{num_qubits} qubits: {engine.nbytes / 2**30:.2f} GiB in {engine.workers} blocks of "
+              f"2^{num_qubits - engine.globals}, {len(ops)} gates, {len(H.terms()[0])} terms")
+        start = time.perf_counter()
+        if deferred:
+            engine.random_state(args.seed)
+            initial = engine.state() if args.reference else None
+        elif ops and isinstance(ops[0], qml.operation.StatePrepBase):
+            engine.load(ops[0].state_vector(wire_order=range(num_qubits)))
+            ops = ops[1:]
+        engine.apply(ops)
+        # A plain score (binding_affinity) post-processes its QNode's energy
+        energy = float(run_score(module, score, circuit_args, lambda *_: engine.expval(H)))
+        elapsed = time.perf_counter() - start
+        print(f"Energy {energy:.10f} in {elapsed:.2f} s: {engine.passes} passes, "
+              f"{engine.passes * engine.nbytes / 2**30 / elapsed:.2f} GiB/s")
+
+    if args.reference:
+        dev = qml.device("default.qubit", wires=num_qubits)
+        reference_args = [initial if deferred else circuit_args[0], *circuit_args[1:]]
+        expected = float(run_score(module, score, reference_args, lambda q, *a: qml.QNode(q.func, dev)(*a)))
+        print(f"default.qubit: {expected:.10f} (difference {abs(expected - energy):.1e})")
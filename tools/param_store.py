@@ -0,0 +1,150 @@
+import argparse
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import time
+
+import pennylane as qml
+from pennylane import numpy as np
+
+from loader import load_script
+from vqe import initial_params
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Hamiltonian fingerprint: Pauli word (e.g. "X0 X1") -> coefficient, duplicates merged
+def fingerprint(H):
+    terms = {}
+    for word, coeff in qml.pauli.pauli_sentence(H).items():
+        key = " ".join(f"{word[w]}{w}" for w in sorted(word.keys()))
+        terms[key] = float(np.real(coeff))
+    return terms
+
+# Distance between two fingerprints: (1 - Jaccard overlap of the term sets) plus the
+# relative coefficient distance over the shared terms
+def fingerprint_distance(a, b):
+    union = set(a) | set(b)
+    shared = set(a) & set(b)
+    if not shared:
+        return 1.0 if union else 0.0
+    diff = np.sqrt(sum((a[t] - b[t]) ** 2 for t in shared))
+    norm = np.sqrt(sum(a[t] ** 2 + b[t] ** 2 for t in shared)) + 1e-12
+    return float((1 - len(shared) / len(union)) + diff / norm)
+
+def read_index(store_dir):
+    path = os.path.join(store_dir, "index.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+# Index and parameter files are written to a temporary name and renamed into place,
+# so a reader never sees a partially written store
+def write_index(store_dir, index):
+    path = os.path.join(store_dir, "index.json")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp, path)
+
+# Exclusive lock on the store, held across the index read-modify-write so that concurrent
+# save_solution calls from several processes do not drop each other's entries
+@contextlib.contextmanager
+def store_lock(store_dir):
+    with open(os.path.join(store_dir, "index.lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+# Store optimized ground and excited parameters for a Hamiltonian. One entry is kept per
+# distinct Hamiltonian, replaced only when the new ground energy is lower.
+def save_solution(store_dir, script, H, num_qubits, ground_params, ground_energy, excited_params, excited_energy):
+    os.makedirs(store_dir, exist_ok=True)
+    terms = fingerprint(H)
+    key = hashlib.sha1(json.dumps(terms, sort_keys=True).encode()).hexdigest()[:16]
+    with store_lock(store_dir):
+        index = read_index(store_dir)
+        if key in index and index[key]["ground_energy"] <= ground_energy:
+            return key
+        
+        tmp = os.path.join(store_dir, f"{key}.{os.getpid()}.tmp.npz")
+        np.savez(tmp, ground=np.array(ground_params), excited=np.array(excited_params))
+        os.replace(tmp, os.path.join(store_dir, f"{key}.npz"))
+        
+        index[key] = {
+            "script": os.path.relpath(os.path.abspath(script), repo_root),
+            "num_qubits": num_qubits,
+            "ground_size": len(ground_params),
+            "excited_size": len(excited_params),
+            "ground_energy": float(ground_energy),
+            "excited_energy": float(excited_energy),
+            "saved": time.time(),
+            "terms": terms,
+        }
+        write_index(store_dir, index)
+    return key
+
+# Nearest stored solution with the same register and parameter sizes, as (key, distance, params)
+def nearest_solution(store_dir, H, num_qubits, ground_size):
+    terms = fingerprint(H)
+    best = None
+    for key, entry in read_index(store_dir).items():
+        if entry["num_qubits"] != num_qubits or entry["ground_size"] != ground_size:
+            continue
+        distance = fingerprint_distance(terms, entry["terms"])
+        if best is None or distance < best[1]:
+            best = (key, distance)
+    if best is None:
+        return None
+    with np.load(os.path.join(store_dir, f"{best[0]}.npz")) as data:
+        params = {"ground": np.array(data["ground"]), "excited": np.array(data["excited"])}
+    return best[0], best[1], params
+
+# Run a molecule script's ground and excited state search, seeded from the nearest stored
+# solution when one is close enough, and record the result back into the store
+def run_seeded(script, store_dir, max_distance=0.5, cold_steps=200, warm_steps=50):
+    module = load_script(script)
+    ground_init = initial_params(module)
+    excited_init = None
+    steps = cold_steps
+    
+    match = nearest_solution(store_dir, module.H, module.num_qubits, len(ground_init))
+    if match is not None and match[1] <= max_distance:
+        key, distance, params = match
+        print(f"Seeding from {read_index(store_dir)[key]['script']} (distance {distance:.4f})")
+        ground_init = np.array(params["ground"], requires_grad=True)
+        excited_init = np.array(params["excited"], requires_grad=True)
+        steps = warm_steps
+    else:
+        print("No stored solution close enough, starting from random parameters")
+    
+    print("Finding ground state...")
+    ground_params, ground_energy = module.find_ground_state(ground_init, steps=steps)
+    print(f"Ground state energy: {ground_energy:.6f}")
+    
+    print("\nFinding first excited state...")
+    excited_params, excited_energy = module.find_excited_state(ground_params, init_params=excited_init, steps=steps)
+    print(f"First excited state energy: {excited_energy:.6f}")
+    print(f"\nExcitation energy: {excited_energy - ground_energy:.6f}")
+    
+    save_solution(store_dir, script, module.H, module.num_qubits, ground_params, ground_energy,
+                  excited_params, excited_energy)
+    return ground_energy, excited_energy
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm-start parameter store keyed by Hamiltonian similarity")
+    parser.add_argument("scripts", nargs="+", help="molecule scripts to run, e.g. h/h4_excited_state.py")
+    parser.add_argument("--store", default="param_store", help="store directory")
+    parser.add_argument("--max-distance", type=float, default=0.5)
+    parser.add_argument("--cold-steps", type=int, default=200)
+    parser.add_argument("--warm-steps", type=int, default=50)
+    args = parser.parse_args()
+    
+    for script in args.scripts:
+        print(f"=== {script}")
+        run_seeded(script, args.store, args.max_distance, args.cold_steps, args.warm_steps)
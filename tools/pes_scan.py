@@ -0,0 +1,89 @@
+import argparse
+import inspect
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from pennylane import numpy as np
+
+from loader import hamiltonian_builder, load_script
+from vqe import minimize, random_state, scipy_methods
+
+# Bond coefficient as a function of bond length r: Morse shape equal to c0 at the
+# equilibrium length r0, fading to zero as the bond dissociates and turning
+# repulsive (negative) under compression
+def bond_coefficient(r, r0, c0, a=1.0):
+    return c0 * (1 - (1 - np.exp(-a * (r - r0))) ** 2)
+
+# Ground-state energy of the script's model with its bond coefficient set to `bond`
+def optimize_point(module, builder, bond, params, stepsize, max_steps, tol, method="adam"):
+    module.H = getattr(module, builder)(bond=bond)
+    return minimize(module.circuit, params, stepsize=stepsize, max_steps=max_steps, tol=tol, method=method)
+
+# Walk one branch of the curve outward from equilibrium, each point warm-started
+# from its neighbour's optimized parameters
+def scan_branch(script, builder, coefficients, params, stepsize, max_steps, tol, method="adam"):
+    module = load_script(script)
+    results = []
+    for bond in coefficients:
+        params, energy, steps = optimize_point(module, builder, bond, params, stepsize, max_steps, tol, method)
+        results.append((float(energy), steps))
+        print(f"bond = {bond:.4f}: Energy = {energy:.6f} ({steps} steps)")
+    return results
+
+# Potential-energy surface along r_values. The equilibrium point is optimized cold; the
+# compression and stretching branches then run in parallel processes from its parameters.
+def pes_scan(script, r_values, r0, c0=None, morse_a=1.0, stepsize=0.1, cold_steps=200,
+             warm_steps=50, tol=1e-5, workers=2, method="adam"):
+    module = load_script(script)
+    builder = hamiltonian_builder(module)
+    if "bond" not in inspect.signature(getattr(module, builder)).parameters:
+        raise ValueError(f"{builder} in {script} has no bond coefficient parameter")
+    if c0 is None:
+        c0 = inspect.signature(getattr(module, builder)).parameters["bond"].default
+    
+    r_values = np.array(r_values, requires_grad=False)
+    coefficients = [float(bond_coefficient(r, r0, c0, morse_a)) for r in r_values]
+    eq = int(np.argmin(np.abs(r_values - r0)))
+    
+    print(f"Cold optimization at r = {r_values[eq]:.4f}")
+    eq_params, eq_energy, eq_steps = optimize_point(module, builder, coefficients[eq], random_state(module.num_qubits),
+                                                    stepsize, cold_steps, tol, method)
+    
+    branches = [coefficients[eq - 1::-1] if eq > 0 else [], coefficients[eq + 1:]]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(scan_branch, script, builder, branch, eq_params, stepsize, warm_steps, tol, method)
+                   for branch in branches]
+        left, right = [f.result() for f in futures]
+    
+    results = left[::-1] + [(float(eq_energy), eq_steps)] + right
+    energies = np.array([e for e, _ in results])
+    steps = np.array([s for _, s in results])
+    return r_values, np.array(coefficients), energies, steps
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dissociation curve scan with warm-started VQE")
+    parser.add_argument("script", help="molecule script, e.g. h/h2_excited_state.py")
+    parser.add_argument("--r0", type=float, default=1.0, help="equilibrium bond length")
+    parser.add_argument("--r-min", type=float, default=0.5)
+    parser.add_argument("--r-max", type=float, default=3.0)
+    parser.add_argument("--points", type=int, default=50)
+    parser.add_argument("--morse-a", type=float, default=1.0)
+    parser.add_argument("--warm-steps", type=int, default=50)
+    parser.add_argument("--tol", type=float, default=1e-5)
+    parser.add_argument("--workers", type=int, default=min(2, os.cpu_count()))
+    parser.add_argument("--method", default="adam", choices=("adam",) + scipy_methods)
+    parser.add_argument("--out", help="save the curve to this .npz file")
+    args = parser.parse_args()
+    
+    r, coefficients, energies, steps = pes_scan(args.script, np.linspace(args.r_min, args.r_max, args.points), args.r0,
+                                                morse_a=args.morse_a, warm_steps=args.warm_steps, tol=args.tol,
+                                                workers=args.workers, method=args.method)
+    
+    print("\nr        bond     energy      steps")
+    for row in zip(r, coefficients, energies, steps):
+        print(f"{row[0]:.4f}   {row[1]:.4f}   {row[2]:.6f}   {row[3]}")
+    print(f"Total optimizer steps: {int(np.sum(steps))}")
+    
+    if args.out:
+        np.savez(args.out, r=r, bond=coefficients, energy=energies, steps=steps)
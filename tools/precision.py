@@ -0,0 +1,213 @@
+import argparse
+import inspect
+import math
+import os
+import resource
+import sys
+import time
+
+import pennylane as qml
+from pennylane import numpy as np
+
+from benchmark import drug_target_models, repo_root
+from loader import hamiltonian_builders, load_script
+from vqe import initial_params
+
+# Precision modes for a loaded script: statevector dtype, parameter dtype and Hamiltonian
+# coefficient dtype. "single" halves the statevector and parameter memory traffic.
+modes = {
+    "double": {"complex": np.complex128, "real": np.float64},
+    "single": {"complex": np.complex64, "real": np.float32},
+}
+
+def cast(values, precision):
+    values = qml.math.to_numpy(values)
+    dtype = modes[precision]["complex" if np.iscomplexobj(values) else "real"]
+    return values.astype(dtype)
+
+def cast_params(params, precision):
+    return np.array(cast(params, precision), requires_grad=True)
+
+def cast_hamiltonian(H, precision):
+    coeffs, ops = H.terms()
+    return qml.Hamiltonian(np.array(cast(coeffs, precision), requires_grad=False), ops)
+
+# Circuits that train StatePrep amplitudes stay on default.qubit with backprop, where the
+# state dtype follows the parameters. Gate-parameter circuits move to lightning.qubit, whose
+# c_dtype sets the statevector precision, and use adjoint gradients.
+def trains_amplitudes(qnode):
+    return "StatePrep(params" in inspect.getsource(qnode.func)
+
+def make_device(num_qubits, precision, amplitudes):
+    if not amplitudes:
+        try:
+            return qml.device("lightning.qubit", wires=num_qubits, c_dtype=modes[precision]["complex"]), "adjoint"
+        except Exception:
+            pass
+    return qml.device("default.qubit", wires=num_qubits), "backprop"
+
+# Module-level Hamiltonians, which the QNodes look up by name when they run: module.H of the
+# molecule scripts, mean_z of the scoring scripts
+def module_hamiltonians(module):
+    return [name for name, value in vars(module).items() if isinstance(value, qml.ops.LinearCombination)]
+
+# Switch a loaded script to a precision in place. Every module-level QNode is rebuilt on a
+# device of that precision. `dev` is replaced, so QNodes the script creates later (e.g. in
+# find_excited_state) pick it up too. The module-level Hamiltonians are cast, and the
+# Hamiltonian builders, where the script has any, return coefficients in that precision. The
+# script's own objects are kept in module.full_precision, and restore_precision puts them back.
+def set_precision(module, precision):
+    original = vars(module).setdefault("full_precision", {})
+    original.setdefault("dev", module.dev)
+    for name, value in list(vars(module).items()):
+        if isinstance(value, qml.QNode):
+            original.setdefault(name, value)
+            amplitudes = trains_amplitudes(original[name])
+            dev, diff_method = make_device(module.num_qubits, precision, amplitudes)
+            setattr(module, name, qml.QNode(original[name].func, dev, diff_method=diff_method))
+    module.dev = make_device(module.num_qubits, precision, False)[0]
+
+    for name in module_hamiltonians(module):
+        original.setdefault(name, getattr(module, name))
+        setattr(module, name, cast_hamiltonian(original[name], precision))
+    for builder in hamiltonian_builders(module):
+        original.setdefault(builder, getattr(module, builder))
+        setattr(module, builder, cast_builder(original[builder], precision))
+    module.precision = precision
+
+# Builders may be called inside a QNode: keep the intermediate Hamiltonians off its tape
+def cast_builder(full, precision):
+    def builder(*args, **kwargs):
+        with qml.QueuingManager.stop_recording():
+            return cast_hamiltonian(full(*args, **kwargs), precision)
+    return builder
+
+# Undo set_precision. load_script caches one module per process, and other tools that load
+# the same script expect its original devices, QNodes and Hamiltonian.
+def restore_precision(module):
+    for name, value in vars(module).pop("full_precision", {}).items():
+        setattr(module, name, value)
+    vars(module).pop("precision", None)
+
+# The energy a script optimizes, looked up on the module at call time so that it follows
+# set_precision: molecule scripts' `circuit`, or the drug-target scoring QNode with its fixed
+# arguments. Returns (cost, start params).
+def model_cost(module, script):
+    if script in drug_target_models:
+        score, args = drug_target_models[script][1](module)
+        name = score.__name__
+        return (lambda p: getattr(module, name)(p, *args[1:])), args[0]
+    return (lambda p: module.circuit(p)), initial_params(module)
+
+def cast_optimizer(opt, precision):
+    accumulation = getattr(opt, "accumulation", None)
+    if isinstance(accumulation, dict):
+        opt.accumulation = {k: [cast(a, precision) for a in v] if isinstance(v, list) else v
+                            for k, v in accumulation.items()}
+
+# Adam in the given mode. "mixed" starts in single precision and switches to double once the
+# energy changes by less than switch_tol per step, carrying over the Adam moments. Adam's
+# update comes back in double (the gradients and its step-size arithmetic are float64), so
+# the params and moments are cast back to the current precision after every step. The final
+# energy is re-evaluated with the script's own double-precision objects, which are restored
+# on return. Returns params, final energy, steps taken and the step at which double
+# precision took over.
+def optimize(module, script, mode, params=None, stepsize=0.1, max_steps=200, tol=1e-7, switch_tol=1e-4,
+             log_every=None):
+    precision = "single" if mode in ("single", "mixed") else "double"
+    set_precision(module, precision)
+    try:
+        cost, start = model_cost(module, script)
+        params = cast_params(start if params is None else params, precision)
+        opt = qml.AdamOptimizer(stepsize=stepsize)
+        previous, switched = None, None if mode != "double" else 0
+
+        for i in range(max_steps):
+            params, energy = opt.step_and_cost(cost, params)
+            params = cast_params(params, module.precision)
+            cast_optimizer(opt, module.precision)
+            energy = float(energy)
+            if log_every and (i + 1) % log_every == 0:
+                print(f"Step {i+1} ({module.precision}): Energy = {energy:.6f}")
+            change = None if previous is None else abs(energy - previous)
+            previous = energy
+            if change is None:
+                continue
+            if mode == "mixed" and switched is None and change < switch_tol:
+                switched = i + 1
+                set_precision(module, "double")
+                params = cast_params(params, "double")
+                cast_optimizer(opt, "double")
+            elif change < tol and (mode != "mixed" or switched):
+                break
+    finally:
+        restore_precision(module)
+
+    params = cast_params(params, "double")
+    return params, float(cost(params)), i + 1, switched
+
+# Run every drug-target model in each mode for a few steps from the same start. Mixed switches
+# to double at the first energy change (step 2). Checks that each run ends with a finite energy, that single
+# and mixed stay within `tol` of double, and that the script's own objects are restored.
+# Returns the failures.
+def check_models(steps=3, tol=1e-3, seed=0):
+    failures = []
+    for script in drug_target_models:
+        module = load_script(os.path.join(repo_root, script))
+        saved = dict(vars(module))
+        energies = {}
+        for mode in ("double", "single", "mixed"):
+            np.random.seed(seed)
+            start = time.perf_counter()
+            try:
+                _, energies[mode], _, switched = optimize(module, script, mode, max_steps=steps, tol=0,
+                                                          switch_tol=math.inf)
+            except Exception as error:
+                failures.append(f"{script} {mode}: {type(error).__name__}: {error}")
+                continue
+            print(f"{script} {mode:6s}: {energies[mode]:.8f} in {time.perf_counter() - start:.1f} s"
+                  + (f" (double from step {switched})" if mode == "mixed" else ""))
+            if not math.isfinite(energies[mode]):
+                failures.append(f"{script} {mode}: energy {energies[mode]}")
+            changed = [name for name, value in saved.items() if vars(module).get(name) is not value]
+            if changed:
+                failures.append(f"{script} {mode}: not restored: {changed}")
+        for mode in ("single", "mixed"):
+            if mode in energies and "double" in energies and abs(energies[mode] - energies["double"]) > tol:
+                failures.append(f"{script} {mode}: {energies[mode]:.8f} vs double {energies['double']:.8f}")
+    return failures
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a script's optimization in double, single or mixed precision")
+    parser.add_argument("script", nargs="?", help="e.g. h/h2_excited_state.py or drug-target/3ammonia.py")
+    parser.add_argument("--mode", choices=["double", "single", "mixed"], default="mixed")
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--stepsize", type=float, default=0.1)
+    parser.add_argument("--tol", type=float, default=1e-7)
+    parser.add_argument("--switch-tol", type=float, default=1e-4, help="energy change that triggers double")
+    parser.add_argument("--check", action="store_true", help="run every drug-target model in all three modes "
+                        "for --check-steps steps")
+    parser.add_argument("--check-steps", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.check:
+        failures = check_models(args.check_steps, seed=args.seed)
+        print("\n".join(["", *failures]) if failures else "\nAll drug-target models pass in every mode")
+        sys.exit(1 if failures else 0)
+    if args.script is None:
+        parser.error("give a script or --check")
+
+    np.random.seed(args.seed)
+    script = os.path.relpath(os.path.abspath(args.script), repo_root)
+    module = load_script(os.path.join(repo_root, script))
+    start = time.perf_counter()
+    params, energy, steps, switched = optimize(module, script, args.mode, stepsize=args.stepsize,
+                                               max_steps=args.steps, tol=args.tol, switch_tol=args.switch_tol,
+                                               log_every=20)
+    elapsed = time.perf_counter() - start
+    print(f"\n{args.mode}: Energy (double) = {energy:.8f} after {steps} steps in {elapsed:.1f} s "
+          f"({elapsed / steps * 1e3:.0f} ms/step), peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+    if args.mode == "mixed":
+        print(f"Switched to double at step {switched}" if switched else "Stayed in single precision")
@@ -0,0 +1,164 @@
+import argparse
+import ast
+import atexit
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+
+# Profiling is switched on by pointing QUANTUM_PROFILE at the trace file to write, e.g.
+#   QUANTUM_PROFILE=trace.json python tools/checkpoint.py molecule h/h2_excited_state.py --checkpoint c.npz
+# It works through tools/loader.py: the hooks are installed when load_script runs a script,
+# before any of the script's code. Running a script directly (python h/h2_excited_state.py)
+# never imports this module, so QUANTUM_PROFILE has no effect there; use
+#   python tools/profiling.py h/h2_excited_state.py
+# instead. When it is unset nothing is patched, so the hooks cost nothing.
+enabled = bool(os.environ.get("QUANTUM_PROFILE"))
+
+events = []
+installed = False
+origin = time.perf_counter()
+
+# Histogram bucket upper bounds in microseconds
+buckets = [10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+def record(name, start, end):
+    events.append((name, (start - origin) * 1e6, (end - start) * 1e6, threading.get_ident()))
+
+# Wrap fn so each call is recorded as one `name` span
+def timed(name, fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            record(name, start, time.perf_counter())
+    wrapper.profiled = True
+    return wrapper
+
+def patch(owner, attribute, name):
+    fn = getattr(owner, attribute, None)
+    if fn is None or getattr(fn, "profiled", False):
+        return
+    wrapper = timed(name, fn)
+    if isinstance(inspect.getattr_static(owner, attribute), staticmethod):
+        wrapper = staticmethod(wrapper)
+    setattr(owner, attribute, wrapper)
+
+# Hooks around the phases of one optimization step: the optimizer step and gradient, QNode calls,
+# tape construction, device execution (state simulation and expectation for default.qubit)
+# and the autograd backward pass
+def install():
+    global installed
+    if installed:
+        return
+    installed = True
+
+    import autograd.core
+    import pennylane as qml
+
+    # Modules are looked up in sys.modules: their package namespaces re-export functions
+    # under the same names (e.g. pennylane.devices.qubit.simulate is also a function)
+    execution = sys.modules["pennylane.workflow.execution"]
+    simulate = sys.modules["pennylane.devices.qubit.simulate"]
+    default_qubit = sys.modules["pennylane.devices.default_qubit"]
+
+    patch(qml.GradientDescentOptimizer, "step", "optimizer step")
+    patch(qml.GradientDescentOptimizer, "step_and_cost", "optimizer step")
+    patch(qml.GradientDescentOptimizer, "compute_grad", "gradient")
+    patch(qml.QNode, "__call__", "qnode")
+    patch(qml.QNode, "construct", "tape construction")
+    patch(execution, "run", "device execution")
+    for module in (simulate, default_qubit):
+        patch(module, "get_final_state", "state simulation")
+        patch(module, "measure_final_state", "expectation")
+    patch(autograd.core, "backward_pass", "autograd backward")
+    atexit.register(write_trace)
+
+# Run a loaded script's module body with the hooks installed. Top-level statements run one at
+# a time and each *_hamiltonian builder is wrapped as soon as it is defined, so builds at module
+# level (H = h2_hamiltonian()) are recorded too.
+def exec_module(module, path):
+    install()
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    namespace = vars(module)
+    for node in tree.body:
+        exec(compile(ast.Module(body=[node], type_ignores=[]), path, "exec"), namespace)
+        if isinstance(node, ast.FunctionDef) and node.name.endswith("_hamiltonian"):
+            namespace[node.name] = timed("hamiltonian construction", namespace[node.name])
+
+# Per-phase count, total, percentiles and a log-scale histogram of span durations (microseconds)
+def summary():
+    phases = {}
+    for name, _, duration, _ in events:
+        phases.setdefault(name, []).append(duration)
+    stats = {}
+    for name, durations in phases.items():
+        durations.sort()
+        histogram = [0] * (len(buckets) + 1)
+        for d in durations:
+            histogram[next((i for i, bound in enumerate(buckets) if d <= bound), len(buckets))] += 1
+        stats[name] = {
+            "count": len(durations),
+            "total_ms": sum(durations) / 1e3,
+            "p50_ms": durations[len(durations) // 2] / 1e3,
+            "p90_ms": durations[min(len(durations) - 1, int(len(durations) * 0.9))] / 1e3,
+            "max_ms": durations[-1] / 1e3,
+            "histogram_us": dict(zip([f"<={b}" for b in buckets] + [f">{buckets[-1]}"], histogram)),
+        }
+    return stats
+
+def print_summary(stats):
+    print("\nPhase                      count   total ms     p50 ms     p90 ms     max ms")
+    for name, s in sorted(stats.items(), key=lambda item: -item[1]["total_ms"]):
+        print(f"{name:<25} {s['count']:>6} {s['total_ms']:>10.1f} {s['p50_ms']:>10.3f} "
+              f"{s['p90_ms']:>10.3f} {s['max_ms']:>10.1f}")
+
+# Write the Chrome trace-event file (open in chrome://tracing or Perfetto) with the
+# per-phase statistics stored alongside the events
+def write_trace(path=None):
+    path = path or os.environ.get("QUANTUM_PROFILE") or "profile-trace.json"
+    if not events:
+        return
+    stats = summary()
+    trace = {
+        "traceEvents": [{"name": name, "cat": "quantum", "ph": "X", "ts": start, "dur": duration,
+                         "pid": os.getpid(), "tid": tid} for name, start, duration, tid in events],
+        "displayTimeUnit": "ms",
+        "otherData": {"phases": stats},
+    }
+    with open(path, "w") as f:
+        json.dump(trace, f)
+    print_summary(stats)
+    print(f"Trace written to {path}")
+
+# Run a script's `if __name__ == "__main__":` block with profiling hooks installed
+def profile_script(script):
+    from loader import load_script, main_code
+
+    install()
+    start = time.perf_counter()
+    module = load_script(script)
+    record("script load", start, time.perf_counter())
+
+    start = time.perf_counter()
+    exec(main_code(script), vars(module))
+    record("main", start, time.perf_counter())
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile a molecule or drug-target script by phase")
+    parser.add_argument("script", help="script to run, e.g. drug-target/3ammonia.py")
+    parser.add_argument("--trace", help="trace file (default: $QUANTUM_PROFILE or profile-trace.json)")
+    args = parser.parse_args()
+
+    os.environ["QUANTUM_PROFILE"] = args.trace or os.environ.get("QUANTUM_PROFILE") or "profile-trace.json"
+
+    # Run through the imported module so the hooks installed by the loader share its event list
+    import profiling
+    profiling.profile_script(args.script)
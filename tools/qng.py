@@ -0,0 +1,115 @@
+import argparse
+import os
+import time
+
+import numpy
+import pennylane as qml
+from pennylane import numpy as np
+from pennylane.devices.qubit import apply_operation, create_initial_state
+
+from benchmark import drug_target_models, repo_root
+from loader import load_script
+
+# Block-diagonal Fubini-Study metric for the layered RY/RZ drug-target circuits, used by
+# qml.QNGOptimizer through its metric_tensor_fn hook. qml.metric_tensor(approx="block-diag")
+# runs a separate circuit per layer. Here one statevector pass yields every block: at each
+# layer the state is copied once per generator, and the block is a single Gram matrix.
+
+# Parametrized rotations and the Pauli generating them, U(theta) = exp(-i theta P / 2)
+generators = {"RX": qml.PauliX, "RY": qml.PauliY, "RZ": qml.PauliZ}
+
+# Split a gate sequence into (gates applied before the layer, layer rotations). A trainable
+# rotation joins the current layer when no layer gate and no deferred gate has touched its
+# wire, so it commutes past everything it is moved ahead of. Everything else is deferred to
+# the following layers.
+def split_layers(ops, trainable):
+    blocks = []
+    remaining = list(ops)
+    while remaining:
+        first = next((k for k, op in enumerate(remaining) if id(op) in trainable), None)
+        if first is None:
+            break
+        layer, deferred, touched = [], [], set()
+        for op in remaining[first:]:
+            if id(op) in trainable and op.wires[0] not in touched:
+                layer.append(op)
+            else:
+                deferred.append(op)
+            touched.update(op.wires)
+        blocks.append((remaining[:first], layer))
+        remaining = deferred
+    return blocks
+
+# Metric over the gate angles: per layer, g_ij = (Re<P_i psi|P_j psi> - <P_i><P_j>) / 4
+# evaluated on the state entering the layer
+def gate_metric(tape, wires):
+    layer_index = {}
+    for k in range(len(tape.trainable_params)):
+        op, op_idx, _ = tape.get_operation(k)
+        if op.name not in generators:
+            raise ValueError(f"Block-diagonal metric supports RX/RY/RZ parameters, not {op.name}")
+        layer_index[op_idx] = len(layer_index)
+
+    # Simulate on plain numpy copies of the gates
+    ops = [qml.ops.functions.bind_new_parameters(op, [qml.math.to_numpy(d) for d in op.data])
+           for op in tape.operations]
+    position = {id(ops[n]): i for n, i in layer_index.items()}
+    prep = ops[0] if ops and isinstance(ops[0], qml.operation.StatePrepBase) else None
+    state = create_initial_state(wires, prep)
+
+    metric = numpy.zeros((len(position), len(position)))
+    for prefix, layer in split_layers(ops[1:] if prep else ops, position):
+        for op in prefix:
+            state = apply_operation(op, state)
+        flat = state.reshape(-1)
+        rotated = numpy.stack([apply_operation(generators[op.name](op.wires), state).reshape(-1) for op in layer])
+        means = (rotated @ flat.conj()).real
+        block = (rotated.conj() @ rotated.T).real - numpy.outer(means, means)
+        index = [position[id(op)] for op in layer]
+        metric[numpy.ix_(index, index)] = block / 4
+        for op in layer:
+            state = apply_operation(op, state)
+    return metric
+
+# Metric function for QNGOptimizer(metric_tensor_fn=...): maps the gate-angle metric onto the
+# circuit's first argument through the classical Jacobian of the angles
+def block_diag_metric(qnode):
+    jacobian = qml.gradients.classical_jacobian(qnode, argnum=0)
+    def metric_fn(params, *args):
+        tape = qml.workflow.construct_tape(qnode)(params, *args)
+        J = qml.math.to_numpy(jacobian(params, *args))
+        return np.array(J.T @ gate_metric(tape, qnode.device.wires) @ J, requires_grad=False)
+    return metric_fn
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare Adam with block-diagonal natural gradient")
+    parser.add_argument("script", nargs="?", default="drug-target/application.py",
+                        choices=["drug-target/application.py", "drug-target/covid/SARS-CoV-2-main-protease.py"])
+    parser.add_argument("--steps", type=int, default=40)
+    parser.add_argument("--adam-steps", type=int, default=100)
+    parser.add_argument("--stepsize", type=float, default=0.1)
+    parser.add_argument("--lam", type=float, default=0.1, help="metric regularization")
+    parser.add_argument("--momentum", type=float, default=0.9, help="0 uses plain QNGOptimizer")
+    parser.add_argument("--refresh", type=int, default=5, help="steps between metric updates")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    np.random.seed(args.seed)
+    module = load_script(os.path.join(repo_root, args.script))
+    qnode, circuit_args = drug_target_models[args.script][1](module)
+    params, fixed = circuit_args[0], [np.array(a, requires_grad=False) for a in circuit_args[1:]]
+    optimize = (lambda p, **kw: module.vqe_optimize(qnode, p, *fixed, **kw)[0]) if fixed else \
+               (lambda p, **kw: module.vqe_optimize(qnode, p, **kw)[0])
+
+    # Momentum keeps QNG moving on the flat stretches where Adam's normalized steps otherwise win
+    opt = qml.MomentumQNGOptimizer(stepsize=args.stepsize, momentum=args.momentum, lam=args.lam) \
+        if args.momentum else qml.QNGOptimizer(stepsize=args.stepsize, lam=args.lam)
+    for name, steps, kwargs in [
+        ("Adam", args.adam_steps, {}),
+        ("QNG", args.steps, {"opt": opt, "metric_fn": block_diag_metric(qnode), "metric_refresh": args.refresh}),
+    ]:
+        print(f"\n{name}")
+        start = time.perf_counter()
+        final = optimize(params, steps=steps, **kwargs)
+        print(f"{name}: energy {qnode(final, *fixed):.6f} after {steps} steps in {time.perf_counter() - start:.1f} s")
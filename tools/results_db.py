@@ -0,0 +1,252 @@
+import argparse
+import functools
+import glob
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from pennylane import numpy as np
+
+from benchmark import git_commit, peak_rss_mb, repo_root
+from loader import load_script, main_code
+
+# SQLite store for run results: one row per molecule or drug-target run with its
+# configuration, energies, excitation gap, steps, wall time and peak memory, and the
+# per-target affinities of repurposing runs in a second table.
+#   python tools/results_db.py record h/h4_excited_state.py --seed 1
+#   python tools/results_db.py import-sweep sweeps/h
+#   python tools/results_db.py best-gaps
+default_db = os.path.join(repo_root, "results.db")
+
+schema = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    molecule TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    config_hash TEXT NOT NULL,
+    config TEXT NOT NULL,
+    ground_energy REAL,
+    excited_energy REAL,
+    excitation_gap REAL,
+    steps INTEGER,
+    wall_s REAL,
+    peak_rss_mb REAL,
+    git_commit TEXT
+);
+CREATE TABLE IF NOT EXISTS affinities (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    target TEXT NOT NULL,
+    affinity REAL NOT NULL
+);
+-- (molecule, excitation_gap) also serves per-molecule best-gap lookups
+CREATE INDEX IF NOT EXISTS runs_molecule ON runs(molecule, excitation_gap);
+CREATE INDEX IF NOT EXISTS runs_config ON runs(config_hash);
+CREATE INDEX IF NOT EXISTS runs_timestamp ON runs(timestamp);
+CREATE INDEX IF NOT EXISTS affinities_run ON affinities(run_id);
+CREATE INDEX IF NOT EXISTS affinities_target ON affinities(target, affinity);
+"""
+
+run_columns = ("timestamp", "molecule", "kind", "config_hash", "config", "ground_energy", "excited_energy",
+               "excitation_gap", "steps", "wall_s", "peak_rss_mb", "git_commit")
+
+def connect(path=default_db):
+    # Transactions are opened explicitly (BEGIN IMMEDIATE) so concurrent writers serialize
+    db = sqlite3.connect(path, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript(schema)
+    return db
+
+# Stable short hash of a configuration dict
+def config_hash(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+# "h/h4_excited_state.py" -> "h4", "drug-target/3ammonia.py" -> "3ammonia"
+def molecule_name(script):
+    return os.path.splitext(os.path.basename(script))[0].replace("_excited_state", "")
+
+# Fill in the derived columns of a run row: hash, gap, timestamp
+def complete_run(run):
+    run = dict(run)
+    run.setdefault("timestamp", time.time())
+    run["config_hash"] = config_hash(run["config"])
+    run["config"] = json.dumps(run["config"], sort_keys=True)
+    if run.get("excitation_gap") is None and run.get("ground_energy") is not None \
+            and run.get("excited_energy") is not None:
+        run["excitation_gap"] = run["excited_energy"] - run["ground_energy"]
+    return run
+
+# Insert runs (dicts with the run columns, a `config` dict and optional `affinities` as
+# (target, affinity) pairs) in a single transaction: one executemany per table
+def insert_runs(db, runs):
+    runs = [complete_run(r) for r in runs]
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        start = db.execute("SELECT COALESCE(MAX(id), 0) FROM runs").fetchone()[0] + 1
+        ids = range(start, start + len(runs))
+        db.executemany(f"INSERT INTO runs (id, {', '.join(run_columns)}) VALUES (?{', ?' * len(run_columns)})",
+                       [(i,) + tuple(r.get(c) for c in run_columns) for i, r in zip(ids, runs)])
+        db.executemany("INSERT INTO affinities (run_id, target, affinity) VALUES (?, ?, ?)",
+                       [(i, target, float(value)) for i, r in zip(ids, runs) for target, value in r.get("affinities", ())])
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    return list(ids)
+
+# Last value of an energy result that may be a per-step history
+def final_value(energy):
+    return float(energy[-1] if isinstance(energy, (list, tuple)) else energy)
+
+# Wrap the script's run functions so their results and step counts land in `run`. 3ammonia
+# calls vqe_optimize for the excited state too; that call is told apart by its circuit's name.
+# The KRAS and opioid loops return parameters only (and KRAS the last drug candidate), so
+# their final binding affinity is scored here and stored as an affinity for the target.
+def capture(module, run, config):
+    def wrap(name, record):
+        fn = getattr(module, name)
+        signature = inspect.signature(fn)
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            steps = bound.arguments.get("steps", bound.arguments.get("optimization_steps"))
+            config[name] = {k: v for k, v in bound.arguments.items() if isinstance(v, (int, float, str, bool))}
+            result = fn(*args, **kwargs)
+            record(bound.arguments, result)
+            if steps is not None:
+                run["steps"] = (run.get("steps") or 0) + steps
+            return result
+        setattr(module, name, wrapper)
+
+    def vqe(arguments, result):
+        circuit = arguments["circuit"]
+        excited = "excited" in getattr(circuit, "func", circuit).__name__
+        run["excited_energy" if excited else "ground_energy"] = final_value(result[1])
+
+    handlers = {
+        "find_ground_state": lambda a, r: run.update(ground_energy=final_value(r[1])),
+        "find_excited_state": lambda a, r: run.update(excited_energy=final_value(r[1])),
+        "vqe_optimize": vqe,
+        "simulate_drug_repurposing": lambda a, r: run.setdefault("affinities", []).extend(
+            (name, float(value)) for name, value in r),
+        "optimize_drug": lambda a, r: run.setdefault("affinities", []).append(
+            ("KRAS", float(module.binding_affinity(r[0], r[1], a["kras_features"])))),
+        "optimize_interaction": lambda a, r: run.setdefault("affinities", []).append(
+            ("MOR", float(module.binding_affinity(r, module.morphine_features, module.mor_features)))),
+    }
+    for name, record in handlers.items():
+        if callable(getattr(module, name, None)):
+            wrap(name, record)
+
+# Run a script's main block with its results captured and store them as one run
+def record_script(db, script, seed=0):
+    script = os.path.relpath(os.path.abspath(script), repo_root)
+    path = os.path.join(repo_root, script)
+    with open(path, "rb") as f:
+        source = hashlib.sha256(f.read()).hexdigest()[:16]
+    np.random.seed(seed)
+    module = load_script(path)
+    run = {"molecule": molecule_name(script), "kind": "script", "git_commit": git_commit()}
+    config = {"script": script, "seed": seed, "source": source}
+    capture(module, run, config)
+
+    start = time.perf_counter()
+    exec(main_code(path), vars(module))
+    run["wall_s"] = time.perf_counter() - start
+    run["peak_rss_mb"] = peak_rss_mb()
+    run["config"] = config
+    return insert_runs(db, [run])[0]
+
+# Import the per-unit results of a tools/sweep.py directory as one batch
+def import_sweep(db, directory):
+    with open(os.path.join(directory, "sweep.json")) as f:
+        settings = json.load(f)["settings"]
+    runs = []
+    for path in sorted(glob.glob(os.path.join(directory, "results", "*.json"))):
+        with open(path) as f:
+            row = json.load(f)
+        if "energy" not in row:
+            continue
+        config = {"script": row["script"], "stepsize": row["stepsize"], "layers": row["layers"],
+                  "seed": row["seed"], **settings}
+        runs.append({"timestamp": os.stat(path).st_mtime, "molecule": molecule_name(row["script"]),
+                     "kind": "sweep", "config": config, "ground_energy": row["energy"], "steps": row["steps"],
+                     "wall_s": row["seconds"]})
+    return insert_runs(db, runs)
+
+# Import a tools/benchmark.py results file as one batch
+def import_benchmark(db, path):
+    with open(path) as f:
+        report = json.load(f)
+    timestamp = time.mktime(time.strptime(report["timestamp"], "%Y-%m-%dT%H:%M:%S"))
+    runs = [{"timestamp": timestamp, "molecule": molecule_name(row["model"]), "kind": "benchmark",
+             "config": {"script": row["model"], **report["settings"]}, "ground_energy": row.get("energy"),
+             "steps": row.get("optimize_steps"), "wall_s": row.get("optimize_s"), "peak_rss_mb": row.get("peak_rss_mb"),
+             "git_commit": report.get("git_commit")} for row in report["results"] if "error" not in row]
+    return insert_runs(db, runs)
+
+# Smallest positive excitation gap per molecule, with the run it came from. The molecules are
+# walked through runs_molecule one index seek at a time (a loose index scan), and each
+# molecule's best run is the first positive gap in the index, so the cost grows with the
+# number of molecules rather than the number of runs.
+def best_gaps(db):
+    return db.execute("""
+        WITH RECURSIVE molecules(name) AS (
+            SELECT MIN(molecule) FROM runs
+            UNION ALL
+            SELECT (SELECT MIN(molecule) FROM runs WHERE molecule > name) FROM molecules WHERE name IS NOT NULL)
+        SELECT r.molecule, r.excitation_gap, r.ground_energy, r.excited_energy, r.config_hash, r.id
+        FROM molecules JOIN runs r ON r.id = (SELECT id FROM runs WHERE molecule = name AND excitation_gap > 0
+                                              ORDER BY excitation_gap LIMIT 1)
+        ORDER BY r.molecule""").fetchall()
+
+# Lowest ground energy per molecule and configuration
+def best_energies(db, molecule=None):
+    where, args = ("WHERE molecule = ?", (molecule,)) if molecule else ("", ())
+    return db.execute(f"""
+        SELECT molecule, config_hash, MIN(ground_energy), COUNT(*), AVG(wall_s), config
+        FROM runs {where} GROUP BY molecule, config_hash ORDER BY molecule, MIN(ground_energy)""", args).fetchall()
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record and query run results in SQLite")
+    parser.add_argument("--db", default=os.environ.get("QUANTUM_RESULTS_DB", default_db))
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="run a script and store its results")
+    record.add_argument("script", help="e.g. h/h4_excited_state.py or drug-target/3ammonia.py")
+    record.add_argument("--seed", type=int, default=0)
+    commands.add_parser("import-sweep", help="store a tools/sweep.py directory's results").add_argument("directory")
+    commands.add_parser("import-benchmark", help="store a tools/benchmark.py results file").add_argument("path")
+    commands.add_parser("best-gaps", help="smallest positive excitation gap per molecule")
+    energies = commands.add_parser("best-energies", help="lowest ground energy per molecule and configuration")
+    energies.add_argument("--molecule")
+    commands.add_parser("sql", help="run a query").add_argument("query")
+    args = parser.parse_args()
+
+    db = connect(args.db)
+    if args.command in ("record", "import-sweep", "import-benchmark"):
+        if args.command == "record":
+            ids = [record_script(db, args.script, args.seed)]
+        elif args.command == "import-sweep":
+            ids = import_sweep(db, args.directory)
+        else:
+            ids = import_benchmark(db, args.path)
+        print(f"Stored {len(ids)} run(s) in {args.db}")
+        sys.exit(0)
+
+    start = time.perf_counter()
+    if args.command == "best-gaps":
+        for molecule, gap, ground, excited, config, run_id in best_gaps(db):
+            print(f"{molecule:12s} gap {gap:.6f} (ground {ground:.6f}, excited {excited:.6f}) config {config} run {run_id}")
+    elif args.command == "best-energies":
+        for molecule, config, energy, count, wall, text in best_energies(db, args.molecule):
+            print(f"{molecule:12s} {config} {energy:.6f} over {count} runs, {wall or 0:.1f} s avg  {text}")
+    else:
+        for row in db.execute(args.query):
+            print(*row, sep="\t")
+    print(f"Query took {(time.perf_counter() - start) * 1e3:.1f} ms")
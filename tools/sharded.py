@@ -0,0 +1,341 @@
+import argparse
+import functools
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy
+import pennylane as qml
+from pennylane import numpy as np
+from pennylane.devices.qubit import apply_operation
+
+from benchmark import drug_target_models, repo_root
+from loader import hamiltonian_builder, load_script
+from vqe import initial_params
+
+# Statevector split across worker processes through one multiprocessing.shared_memory block.
+# With 2^k workers the k most significant physical qubits are "global": they select the
+# shard (worker). The other n - k are "local" axes of each worker's (2,)*(n-k) tensor. Gates
+# on local qubits run in every worker at once, each on its own shard. A gate or Pauli term
+# on a global qubit first swaps that qubit with a local one: shard pairs exchange the
+# half-slices where the two bits differ, in place in shared memory. The engine then tracks
+# which logical wire sits at which physical position. The state is never copied between
+# processes; only gate lists, term lists and partial sums travel over the pipes.
+
+# Phases of Y = [[0, -i], [i, 0]] once the axis is flipped: (Y psi)[0] = -i psi[1], (Y psi)[1] = i psi[0]
+pauli_phases = {"X": numpy.array([1, 1]), "Y": numpy.array([-1j, 1j]), "Z": numpy.array([1, -1])}
+
+# Largest power of two not above the core count, leaving at least two local qubits
+def default_workers(num_qubits):
+    workers = 1
+    while workers * 2 <= (os.cpu_count() or 1) and workers * 2 <= 2 ** (num_qubits - 2):
+        workers *= 2
+    return workers
+
+def along(vector, axis, ndim):
+    shape = [1] * ndim
+    shape[axis] = 2
+    return vector.reshape(shape)
+
+# <psi|P|psi> restricted to one shard. `local` holds (axis, pauli) pairs; `sign` is the
+# contribution of Z on global qubits for this shard.
+def shard_term(tensor, probabilities, local, sign):
+    flips = tuple(axis for axis, p in local if p in "XY")
+    if not flips:
+        # Diagonal term: marginal of |psi|^2 on its axes against the +-1 pattern
+        axes = tuple(axis for axis, _ in local)
+        marginal = probabilities.sum(axis=tuple(a for a in range(tensor.ndim) if a not in axes))
+        signs = functools.reduce(numpy.multiply.outer, [pauli_phases["Z"]] * len(axes), numpy.array(1))
+        return sign * float(numpy.sum(marginal * signs))
+    image = numpy.flip(tensor, axis=flips)
+    for axis, p in local:
+        image = image * along(pauli_phases[p], axis, tensor.ndim)
+    return sign * numpy.vdot(tensor, image).real
+
+# Run one engine command on shard `rank` of `shards` (shape (shards,) + (2,) * local) and
+# return its result. Only "swap" touches another shard: its pair partner's.
+def shard_command(shards, rank, command, args):
+    local = shards.ndim - 1
+    if command == "zero":
+        shards[rank] = 0
+        if rank == 0:
+            shards[0].reshape(-1)[0] = 1
+    elif command == "gates":
+        tensor = shards[rank]
+        for kind, *data in args[0]:
+            if kind == "op":
+                tensor = apply_operation(data[0], tensor)
+            elif kind == "controlled":
+                op, mask = data
+                if rank & mask == mask:
+                    tensor = apply_operation(op, tensor)
+            else:
+                # Diagonal gate: the global bits of this shard pick the local diagonal
+                diagonal, masks, axes = data
+                d = diagonal[tuple(int(bool(rank & m)) for m in masks)]
+                shape = [2 if a in axes else 1 for a in range(local)]
+                tensor = tensor * numpy.reshape(d, shape)
+        shards[rank] = tensor
+    elif command == "swap":
+        # Exchange the (global bit 0, local bit 1) and (global bit 1, local bit 0) halves of a
+        # shard pair; each of the two shards' workers moves half of them
+        mask, axis = args
+        low, high = rank & ~mask, rank | mask
+        split = 1 if axis == 0 else 0
+        index_low = [slice(None)] * local
+        index_high = [slice(None)] * local
+        index_low[axis], index_high[axis] = 1, 0
+        index_low[split] = index_high[split] = int(rank == high)
+        a = shards[low][tuple(index_low)]
+        b = shards[high][tuple(index_high)]
+        held = a.copy()
+        a[...] = b
+        b[...] = held
+    elif command == "expval":
+        tensor = shards[rank]
+        probabilities = numpy.abs(tensor) ** 2
+        return [shard_term(tensor, probabilities, term_local, -1 if bin(rank & zmask).count("1") % 2 else 1)
+                for zmask, term_local in args[0]]
+    return None
+
+# Worker loop: attach to the shared block and apply commands to shard `rank` until "close"
+def worker(name, num_qubits, workers, rank, pipe):
+    block = shared_memory.SharedMemory(name=name)
+    local = num_qubits - (workers.bit_length() - 1)
+    shards = numpy.ndarray((workers,) + (2,) * local, dtype=numpy.complex128, buffer=block.buf)
+    try:
+        while True:
+            command, *args = pipe.recv()
+            if command == "close":
+                break
+            pipe.send(shard_command(shards, rank, command, args))
+    finally:
+        del shards
+        block.close()
+
+class ShardedState:
+    def __init__(self, num_qubits, workers=None):
+        workers = workers or default_workers(num_qubits)
+        if workers & (workers - 1) or workers > 2 ** (num_qubits - 2):
+            raise ValueError(f"workers must be a power of two leaving two local qubits, got {workers}")
+        self.num_qubits, self.workers = num_qubits, workers
+        self.globals = workers.bit_length() - 1
+        self.block = shared_memory.SharedMemory(create=True, size=16 * 2 ** num_qubits)
+        self.flat = numpy.ndarray(2 ** num_qubits, dtype=numpy.complex128, buffer=self.block.buf)
+        self.pipes, self.processes = [], []
+        for rank in range(workers):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=worker, args=(self.block.name, num_qubits, workers, rank, child),
+                                              daemon=True)
+            process.start()
+            self.pipes.append(parent)
+            self.processes.append(process)
+        self.reset()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for pipe, process in zip(self.pipes, self.processes):
+            pipe.send(("close",))
+            process.join()
+        del self.flat
+        self.block.close()
+        self.block.unlink()
+
+    # Send a command to every worker and wait for all of them: each command is a barrier
+    def broadcast(self, *command):
+        for pipe in self.pipes:
+            pipe.send(command)
+        return [pipe.recv() for pipe in self.pipes]
+
+    def reset(self):
+        self.layout = list(range(self.num_qubits))  # logical wire at each physical position
+        self.broadcast("zero")
+
+    # Start from a full amplitude vector in PennyLane's wire order
+    def load(self, amplitudes):
+        self.layout = list(range(self.num_qubits))
+        self.flat[:] = numpy.ravel(amplitudes)
+
+    # The state in PennyLane's wire order (a copy)
+    def state(self):
+        tensor = self.flat.reshape((2,) * self.num_qubits)
+        return numpy.transpose(tensor, numpy.argsort(self.layout)).reshape(-1).copy()
+
+    def position(self, wire):
+        return self.layout.index(wire)
+
+    # Bring a logical wire onto a local axis, trading places with the local wire in `upcoming`
+    # (a list of wire sets still to be used) that is needed last
+    def localize(self, wire, keep, upcoming):
+        def next_use(w):
+            return next((i for i, wires in enumerate(upcoming) if w in wires), len(upcoming))
+        candidates = [p for p in range(self.globals, self.num_qubits) if self.layout[p] not in keep]
+        target = max(candidates, key=lambda p: next_use(self.layout[p]))
+        source = self.position(wire)
+        self.broadcast("swap", 1 << (self.globals - 1 - source), target - self.globals)
+        self.layout[source], self.layout[target] = self.layout[target], self.layout[source]
+
+    # Gates that touch global qubits without mixing shards: diagonal gates, which become a
+    # per-shard local diagonal, and controlled gates whose global wires are all (|1>) controls,
+    # which only the shards with those bits set apply. Returns the batch entry, or None when
+    # the global qubits have to be swapped in first.
+    def shard_local(self, op, global_wires):
+        bit = lambda w: 1 << (self.globals - 1 - self.position(w))
+        axis = lambda w: self.position(w) - self.globals
+        if isinstance(op, qml.ops.op_math.Controlled) and all(op.control_values) \
+                and set(global_wires) <= set(op.control_wires):
+            local_controls = [w for w in op.control_wires if w not in global_wires]
+            base = qml.ctrl(op.base, control=local_controls) if local_controls else op.base
+            return ("controlled", base.map_wires({w: axis(w) for w in base.wires}), sum(bit(w) for w in global_wires))
+        if len(op.wires) <= 3:
+            matrix = qml.matrix(op)
+            diagonal = numpy.diag(matrix)
+            if numpy.allclose(matrix, numpy.diag(diagonal)):
+                local_wires = sorted((w for w in op.wires if w not in global_wires), key=axis)
+                order = [op.wires.index(w) for w in list(global_wires) + local_wires]
+                diagonal = numpy.transpose(diagonal.reshape((2,) * len(op.wires)), order)
+                return ("diagonal", diagonal, [bit(w) for w in global_wires], [axis(w) for w in local_wires])
+        return None
+
+    # Apply a gate sequence. Runs of gates that need no swap go out as one batch.
+    def apply(self, ops):
+        upcoming = [set(op.wires) for op in ops]
+        batch = []
+        for i, op in enumerate(ops):
+            global_wires = [w for w in op.wires if self.position(w) < self.globals]
+            entry = self.shard_local(op, global_wires) if global_wires else None
+            if entry is None and global_wires:
+                if batch:
+                    self.broadcast("gates", batch)
+                    batch = []
+                for w in global_wires:
+                    self.localize(w, set(op.wires), upcoming[i + 1:])
+            if entry is None:
+                entry = ("op", op.map_wires({w: self.position(w) - self.globals for w in op.wires}))
+            batch.append(entry)
+        if batch:
+            self.broadcast("gates", batch)
+
+    # <H> for a Pauli-sum observable. Z on a global qubit is a per-shard sign; X and Y on a
+    # global qubit need it local, so terms are taken in an order that keeps swaps rare.
+    def expval(self, H):
+        offset, terms = 0.0, []
+        for word, c in qml.pauli.pauli_sentence(H).items():
+            if not word:
+                offset += float(numpy.real(c))
+            else:
+                terms.append((float(numpy.real(c)), dict(word)))
+        flipped = lambda word: {w for w, p in word.items() if p in "XY"}
+        terms.sort(key=lambda t: sorted(self.position(w) for w in flipped(t[1])))
+
+        total, batch = offset, []
+        def flush():
+            partial = numpy.sum(self.broadcast("expval", [t for _, t in batch]), axis=0)
+            return sum(c * v for (c, _), v in zip(batch, partial))
+        for i, (c, word) in enumerate(terms):
+            needed = [w for w in flipped(word) if self.position(w) < self.globals]
+            if needed:
+                if batch:
+                    total += flush()
+                    batch = []
+                for w in needed:
+                    self.localize(w, flipped(word), [flipped(t) for _, t in terms[i + 1:]])
+            zmask = sum(1 << (self.globals - 1 - self.position(w)) for w in word if self.position(w) < self.globals)
+            local = [(self.position(w) - self.globals, p) for w, p in word.items() if self.position(w) >= self.globals]
+            batch.append((c, (zmask, local)))
+        if batch:
+            total += flush()
+        return total
+
+# Run a QNode of the form `gates...; return qml.expval(H)` on the sharded state. A leading
+# StatePrep is loaded directly; trainable parameters are bound to plain numbers.
+def evaluate(engine, qnode, *args):
+    tape = qml.tape.make_qscript(qnode.func)(*args)
+    ops = [qml.ops.functions.bind_new_parameters(op, [qml.math.to_numpy(d) for d in op.data]) for op in tape.operations]
+    if ops and isinstance(ops[0], qml.operation.StatePrepBase):
+        engine.load(ops[0].state_vector(wire_order=range(engine.num_qubits)))
+        ops = ops[1:]
+    else:
+        engine.reset()
+    engine.apply(ops)
+    return engine.expval(tape.measurements[0].obs)
+
+# The score function of a script and its arguments, for the script's qubit count: the energy
+# QNode, or for some drug-target scripts a plain binding_affinity function around one
+def script_model(module, script):
+    if script in drug_target_models:
+        return drug_target_models[script][1](module)
+    return module.circuit, [initial_params(module)]
+
+# Name of the one module-level QNode a plain score function calls
+def score_qnode(module, score):
+    names = [name for name in score.__code__.co_names if isinstance(getattr(module, name, None), qml.QNode)]
+    if len(names) != 1:
+        raise ValueError(f"{score.__name__} calls {len(names)} QNodes of its script ({', '.join(names) or 'none'}); "
+                         f"only a score around exactly one QNode can be evaluated here")
+    return names[0]
+
+# Evaluate a score with its QNode's calls replaced by run(qnode, *args). Plain score functions
+# (the binding_affinity wrappers) keep their own argument handling and post-processing, e.g.
+# opioid's feature concatenation or repurposing's 1 - |<Z>|.
+def run_score(module, score, args, run):
+    if isinstance(score, qml.QNode):
+        return run(score, *args)
+    name = score_qnode(module, score)
+    qnode = getattr(module, name)
+    setattr(module, name, lambda *qnode_args: run(qnode, *qnode_args))
+    try:
+        return score(*args)
+    finally:
+        setattr(module, name, qnode)
+
+# The QNode a score calls and the arguments it passes, found by running the score once with
+# the QNode call recorded instead of executed
+def qnode_call(module, score, args):
+    calls = []
+    run_score(module, score, args, lambda qnode, *qnode_args: calls.append((qnode, qnode_args)) or 0.0)
+    return calls[0]
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate a script's energy on a shared-memory sharded statevector")
+    parser.add_argument("script", nargs="?", default="drug-target/3ammonia.py")
+    parser.add_argument("--workers", type=int, help="power of two (default: cores)")
+    parser.add_argument("--num-qubits", type=int, help="rebuild the model for this many qubits")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-reference", action="store_true", help="skip the default.qubit comparison")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    np.random.seed(args.seed)
+    script = os.path.relpath(os.path.abspath(args.script), repo_root)
+    module = load_script(os.path.join(repo_root, script))
+    if args.num_qubits:
+        # The builders read the module-level qubit count when called
+        module.num_qubits = args.num_qubits
+        if hasattr(module, "H"):
+            module.H = getattr(module, hamiltonian_builder(module))()
+    score, circuit_args = script_model(module, script)
+    num_qubits = module.num_qubits
+
+    with ShardedState(num_qubits, args.workers) as engine:
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            energy = float(run_score(module, score, circuit_args, functools.partial(evaluate, engine)))
+            times.append(time.perf_counter() - start)
+        print(f"{num_qubits} qubits on {engine.workers} workers ({os.cpu_count()} cores): "
+              f"energy {energy:.10f} in {min(times):.2f} s")
+
+    if not args.no_reference:
+        dev = qml.device("default.qubit", wires=num_qubits)
+        start = time.perf_counter()
+        expected = run_score(module, score, circuit_args, lambda qnode, *a: qml.QNode(qnode.func, dev)(*a))
+        print(f"default.qubit: energy {float(expected):.10f} in {time.perf_counter() - start:.2f} s "
+              f"(difference {abs(float(expected) - energy):.1e})")
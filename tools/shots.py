@@ -0,0 +1,159 @@
+import argparse
+import math
+import os
+
+import pennylane as qml
+from pennylane import numpy as np
+
+from benchmark import drug_target_models, repo_root
+from loader import load_script
+
+# Finite-shot VQE for the drug-target models with the shot budget spread over the Hamiltonian.
+# Terms are measured in qubit-wise commuting groups (one circuit execution per group), and a
+# group gets shots in proportion to sigma_g, the standard deviation of its single-shot
+# estimate sum_i c_i s_i. For a group holding one term that is |c|·sigma. This split minimizes
+# the variance of the energy estimate for a given total number of shots.
+
+# Replay a QNode's gate sequence without its measurement, so the same ansatz can be
+# measured group by group
+def ansatz(qnode):
+    def replay(*args, **kwargs):
+        with qml.queuing.AnnotatedQueue() as q:
+            qnode.func(*args, **kwargs)
+        for op in qml.tape.QuantumScript.from_queue(q).operations:
+            qml.apply(op)
+    return replay
+
+# The Hamiltonian measured by a QNode of the form `return qml.expval(H)`
+def measured_hamiltonian(qnode, *args):
+    tape = qml.workflow.construct_tape(qnode)(*args)
+    return tape.measurements[0].obs
+
+# Split H into qubit-wise commuting groups of (coefficients, terms), plus the identity offset
+def measurement_groups(H):
+    coeffs, ops = H.terms()
+    offset = sum(float(c) for c, op in zip(coeffs, ops) if not op.wires)
+    terms = [(float(c), op) for c, op in zip(coeffs, ops) if op.wires]
+    grouped_ops, grouped_coeffs = qml.pauli.group_observables([op for _, op in terms], [c for c, _ in terms])
+    groups = [(np.array(c, requires_grad=False), list(o)) for o, c in zip(grouped_ops, grouped_coeffs)]
+    return groups, offset
+
+# One differentiable QNode per group returning each term's expectation value
+def group_qnodes(replay, groups, dev):
+    qnodes = []
+    for _, terms in groups:
+        def circuit(*args, terms=terms):
+            replay(*args)
+            return [qml.expval(t) for t in terms]
+        qnodes.append(qml.QNode(circuit, dev, diff_method="parameter-shift"))
+    return qnodes
+
+# Re-estimate each group's single-shot standard deviation from samples. The terms of a group
+# share the same shots, so covariances between them are included.
+def estimate_sigmas(replay, groups, dev, params, args, shots):
+    sigmas = []
+    for coeffs, terms in groups:
+        def circuit(*a, terms=terms):
+            replay(*a)
+            return [qml.sample(t) for t in terms]
+        samples = qml.set_shots(qml.QNode(circuit, dev), shots=shots)(params, *args)
+        values = sum(c * np.reshape(s, -1) for c, s in zip(coeffs, samples))
+        sigmas.append(float(np.std(values, ddof=1)))
+    return np.array(sigmas)
+
+# Shots per group for a target standard error: N = (sum sigma)^2 / precision^2 split in
+# proportion to sigma. Groups with (near) zero variance still get min_shots.
+def allocate(sigmas, precision, min_shots=10, max_shots=None):
+    total = float(np.sum(sigmas))
+    budget = (total / precision) ** 2
+    if max_shots is not None:
+        budget = min(budget, max_shots)
+    return [max(min_shots, math.ceil(budget * s / total)) if total > 0 else min_shots for s in sigmas]
+
+# Standard error of the energy estimate for a shot allocation
+def standard_error(sigmas, shots):
+    return float(np.sqrt(np.sum(np.array(sigmas) ** 2 / np.array(shots))))
+
+# Energy estimate from the group QNodes at the given shot counts
+def shot_cost(qnodes, groups, shots, offset, args):
+    shot_qnodes = [qml.set_shots(q, shots=n) for q, n in zip(qnodes, shots)]
+    def cost(params):
+        energy = offset
+        for (coeffs, _), q in zip(groups, shot_qnodes):
+            energy = energy + qml.math.sum(coeffs * qml.math.stack(q(params, *args)))
+        return energy
+    return cost
+
+# Finite-shot VQE. Optimization starts at a coarse standard error (start_precision). The
+# precision is halved whenever the energy has improved by less than it over `patience` steps,
+# i.e. once progress is lost in the shot noise. It stops after stalling at the target
+# precision. The group variances are re-estimated every `refresh` steps. Returns params, the
+# final energy estimate, its standard error, total shots used (gradients included) and
+# per-step history rows (step, energy, precision, shots per evaluation).
+def adaptive_vqe(qnode, params, args=(), precision=1e-2, start_precision=None, opt=None,
+                 max_steps=200, refresh=10, sigma_shots=200, min_shots=10, patience=5,
+                 seed=None, log_every=None):
+    dev = qml.device("default.qubit", wires=qnode.device.wires, seed=seed)
+    replay = ansatz(qnode)
+    groups, offset = measurement_groups(measured_hamiltonian(qnode, params, *args))
+    qnodes = group_qnodes(replay, groups, dev)
+    opt = qml.AdamOptimizer(stepsize=0.1) if opt is None else opt
+    current = start_precision or 8 * precision
+
+    history = []
+    since = 0
+    with qml.Tracker(dev) as tracker:
+        for i in range(max_steps):
+            if i % refresh == 0:
+                sigmas = estimate_sigmas(replay, groups, dev, params, args, sigma_shots)
+            shots = allocate(sigmas, current, min_shots)
+            params, energy = opt.step_and_cost(shot_cost(qnodes, groups, shots, offset, args), params)
+            history.append((i + 1, float(energy), current, sum(shots)))
+            if log_every and (i + 1) % log_every == 0:
+                print(f"Step {i+1}: Energy = {energy:.6f} (precision {current:.4f}, {sum(shots)} shots)")
+
+            if len(history) - since > patience and history[-1 - patience][1] - energy < current:
+                if current <= precision:
+                    break
+                current = max(precision, current / 2)
+                since = len(history) - 1
+
+        sigmas = estimate_sigmas(replay, groups, dev, params, args, sigma_shots)
+        shots = allocate(sigmas, precision, min_shots)
+        energy = shot_cost(qnodes, groups, shots, offset, args)(params)
+        total_shots = tracker.totals.get("shots", 0)
+
+    return params, float(energy), standard_error(sigmas, shots), total_shots, history
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Finite-shot VQE with variance-weighted shot allocation")
+    parser.add_argument("script", choices=[s for s in drug_target_models if "ammonia" in s or "application" in s
+                                           or "SARS" in s])
+    parser.add_argument("--precision", type=float, default=1e-2, help="target standard error of the energy")
+    parser.add_argument("--start-precision", type=float)
+    parser.add_argument("--max-steps", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    np.random.seed(args.seed)
+    module = load_script(os.path.join(repo_root, args.script))
+    qnode, circuit_args = drug_target_models[args.script][1](module)
+    params, fixed = circuit_args[0], circuit_args[1:]
+
+    params, energy, error, total_shots, history = adaptive_vqe(
+        qnode, params, fixed, precision=args.precision, start_precision=args.start_precision,
+        max_steps=args.max_steps, seed=args.seed, log_every=10)
+
+    exact = qnode(params, *fixed)
+    print(f"\nEnergy = {energy:.6f} +/- {error:.6f} (exact {exact:.6f}) after {len(history)} steps")
+    print(f"Total shots: {total_shots}")
+
+    # Shots the final estimate would need with the budget split equally over the groups
+    groups, _ = measurement_groups(measured_hamiltonian(qnode, params, *fixed))
+    replay = ansatz(qnode)
+    dev = qml.device("default.qubit", wires=qnode.device.wires, seed=args.seed)
+    sigmas = estimate_sigmas(replay, groups, dev, params, fixed, 1000)
+    weighted = sum(allocate(sigmas, args.precision, min_shots=1))
+    equal = math.ceil(len(sigmas) * float(np.sum(sigmas ** 2)) / args.precision ** 2)
+    print(f"Shots per energy estimate at +/- {args.precision}: {weighted} weighted vs {equal} equal split")
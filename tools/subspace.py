@@ -0,0 +1,126 @@
+import argparse
+import time
+
+import numpy
+import pennylane as qml
+import scipy.linalg
+import scipy.sparse.linalg
+from pennylane import numpy as np
+
+from loader import hamiltonian_builder, load_script
+from vqe import random_state
+
+# Quantum subspace expansion: excited energies from the optimized ground state without a
+# second optimization. The ground state |psi> is expanded in the basis P_k|psi>. Singles use
+# every Pauli word P_k of the Hamiltonian, and doubles every product P_j P_k of two of them.
+# H and the overlap S are projected onto that basis, and the generalized eigenproblem
+# H c = E S c gives the subspace energies. The lowest one is a refined ground energy.
+
+# Pauli word as (x, z) bit masks over the statevector index (wire 0 most significant);
+# Y sets both bits. Products of words are the XOR of the masks up to a phase, which does not
+# change the span.
+def word_masks(word, num_qubits):
+    x = z = 0
+    for wire, pauli in word.items():
+        bit = 1 << (num_qubits - 1 - wire)
+        if pauli in ("X", "Y"):
+            x |= bit
+        if pauli in ("Z", "Y"):
+            z |= bit
+    return x, z
+
+# Expansion operators as (x, z) masks: the identity, the Hamiltonian's words and, with
+# doubles, their pairwise products, without duplicates
+def expansion_operators(H, num_qubits, doubles=False):
+    singles = [word_masks(word, num_qubits) for word in qml.pauli.pauli_sentence(H)]
+    operators = dict.fromkeys([(0, 0)] + singles)
+    if doubles:
+        for i, (x1, z1) in enumerate(singles):
+            for x2, z2 in singles[i + 1:]:
+                operators.setdefault((x1 ^ x2, z1 ^ z2))
+    return list(operators)
+
+# Pauli words as gathers over a 2^n state: (P_k psi)[i] = phases[i, k] psi[source[i, k]].
+# For a basis state |j>, P|j> = i^(number of Y) (-1)^popcount(j & z) |j ^ x>.
+def pauli_gathers(size, operators):
+    index = numpy.arange(size)
+    x = numpy.array([o[0] for o in operators])
+    z = numpy.array([o[1] for o in operators])
+    source = index[:, None] ^ x[None, :]
+    signs = 1 - 2 * (numpy.bitwise_count(source & z[None, :]).astype(int) & 1)
+    return source, signs * 1j ** numpy.bitwise_count(x & z).astype(int)[None, :]
+
+# All P_k|psi> as the columns of one (2^n, K) array
+def expansion_basis(state, operators):
+    source, phases = pauli_gathers(len(state), operators)
+    return state[source] * phases
+
+# Projected H and S in one pass: H V from the sparse Hamiltonian, then two K x K products
+def subspace_matrices(H, basis, num_qubits):
+    sparse = H.sparse_matrix(wire_order=range(num_qubits))
+    hamiltonian = basis.conj().T @ (sparse @ basis)
+    overlap = basis.conj().T @ basis
+    return (hamiltonian + hamiltonian.conj().T) / 2, (overlap + overlap.conj().T) / 2
+
+# Generalized eigenvalues of (H, S). Products of Pauli words acting on one state are often
+# linearly dependent. Overlap eigenvalues below threshold (relative to the largest) are
+# therefore dropped: canonical orthogonalization. Returns the energies and the rank kept.
+def subspace_energies(hamiltonian, overlap, threshold=1e-8):
+    s, u = scipy.linalg.eigh(overlap)
+    keep = s > threshold * s[-1]
+    x = u[:, keep] / numpy.sqrt(s[keep])
+    return scipy.linalg.eigh(x.conj().T @ hamiltonian @ x, eigvals_only=True), int(keep.sum())
+
+# Final state of a script's ground-state circuit at `params`
+def circuit_state(circuit, params):
+    tape = qml.tape.make_qscript(circuit.func)(params)
+    state_tape = qml.tape.QuantumScript(tape.operations, [qml.state()])
+    return numpy.asarray(qml.execute([state_tape], circuit.device)[0])
+
+# Subspace energies around the ground state `params` of a molecule script
+def expand(module, params, doubles=False, threshold=1e-8):
+    H, num_qubits = module.H, module.num_qubits
+    operators = expansion_operators(H, num_qubits, doubles)
+    basis = expansion_basis(circuit_state(module.circuit, params), operators)
+    energies, rank = subspace_energies(*subspace_matrices(H, basis, num_qubits), threshold)
+    return energies, len(operators), rank
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Excited energies of a molecule script by subspace expansion "
+                                                 "around its optimized ground state")
+    parser.add_argument("script", nargs="?", default="h/h4_excited_state.py")
+    parser.add_argument("--steps", type=int, default=200, help="find_ground_state steps")
+    parser.add_argument("--doubles", action="store_true", help="add products of two Hamiltonian words")
+    parser.add_argument("--states", type=int, default=4, help="energies to report")
+    parser.add_argument("--threshold", type=float, default=1e-8, help="relative overlap eigenvalue cutoff")
+    parser.add_argument("--compare", action="store_true", help="also run the script's find_excited_state")
+    parser.add_argument("--exact", action="store_true", help="compare with sparse diagonalization")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    np.random.seed(args.seed)
+    module = load_script(args.script)
+    if not hasattr(module, "H"):
+        module.H = getattr(module, hamiltonian_builder(module))()
+    num_qubits = module.num_qubits
+
+    print("Finding ground state...")
+    ground_params, ground_energy = module.find_ground_state(random_state(num_qubits), steps=args.steps)
+    print(f"Ground state energy: {float(ground_energy):.6f}")
+
+    start = time.perf_counter()
+    energies, size, rank = expand(module, ground_params, args.doubles, args.threshold)
+    elapsed = time.perf_counter() - start
+    print(f"\nSubspace of {size} operators (rank {rank}) in {elapsed:.2f} s:")
+    for i, energy in enumerate(energies[:args.states]):
+        print(f"  E{i} = {energy:.6f}" + (f"  (gap {energy - energies[0]:.6f})" if i else ""))
+
+    if args.compare:
+        start = time.perf_counter()
+        _, excited_energy = module.find_excited_state(ground_params)
+        print(f"find_excited_state: {float(excited_energy):.6f} in {time.perf_counter() - start:.2f} s")
+    if args.exact:
+        sparse = module.H.sparse_matrix(wire_order=range(num_qubits))
+        exact = numpy.sort(scipy.sparse.linalg.eigsh(sparse, k=args.states, which="SA", return_eigenvectors=False))
+        print("Exact: " + ", ".join(f"{e:.6f}" for e in exact))
@@ -0,0 +1,292 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+import pennylane as qml
+from pennylane import numpy as np
+
+from benchmark import drug_target_models, molecule_models, repo_root
+from loader import hamiltonian_builder, load_script
+from vqe import initial_params, minimize, scipy_methods
+
+# Stepsize x layer count x seed sweeps over the molecule and drug-target scripts, run by any
+# number of workers on machines that share only a filesystem. The sweep directory holds
+#   sweep.json        grid and optimizer settings
+#   pending/<id>.json work units not yet claimed
+#   claimed/<id>.<owner>.json units being worked on; the file's mtime is the worker's lease
+#   results/<id>.json one result row per finished unit
+# A worker claims a unit by renaming it from pending/ to claimed/ under its own owner name.
+# rename is atomic on a shared filesystem, so exactly one worker wins each unit. The unit is
+# touched just before the rename, so a fresh claim never looks expired. While the unit runs
+# the worker touches its claim; a claim whose mtime is older than the lease belongs to a dead
+# worker, and any worker moves it back to pending/ (again by rename, so only one of them
+# does). A worker only ever removes its own claim file, so a slow worker whose unit was
+# reclaimed and claimed again does not release the new owner's claim.
+#   python tools/sweep.py init sweeps/h --scripts 'h/h[2-4]_' --stepsizes 0.05 0.1 --seeds 0 1 2
+#   python tools/sweep.py work sweeps/h          # on every node, as often as there are cores
+#   python tools/sweep.py merge sweeps/h --out sweeps/h.csv
+
+# Columns of the merged table, in order; any other result fields follow
+table_columns = ["id", "script", "stepsize", "layers", "seed", "energy", "steps", "seconds", "worker", "error"]
+
+# Scripts with a *_hamiltonian builder can be swept over layer counts of a generic ansatz
+def has_hamiltonian(script):
+    with open(os.path.join(repo_root, script)) as f:
+        return re.search(r"^def \w+_hamiltonian\(", f.read(), re.M) is not None
+
+# Expand the grid into work units. layers=0 is the script's own circuit; a positive count
+# replaces it with `layered_ansatz` on the script's Hamiltonian, so scripts without a
+# Hamiltonian (the binding-affinity models) only get layers=0.
+def expand_grid(scripts, stepsizes, layers, seeds):
+    units = []
+    for script in scripts:
+        counts = layers if has_hamiltonian(script) else [0]
+        for stepsize, count, seed in itertools.product(stepsizes, dict.fromkeys(counts), seeds):
+            units.append({"id": f"u{len(units):05d}", "script": script, "stepsize": stepsize,
+                          "layers": count, "seed": seed})
+    return units
+
+# Write JSON under a temporary name and rename it into place, so readers on other nodes never
+# see a partial file
+def write_json(path, data):
+    tmp = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+def init_sweep(directory, units, settings):
+    for sub in ("pending", "claimed", "results"):
+        os.makedirs(os.path.join(directory, sub), exist_ok=True)
+    write_json(os.path.join(directory, "sweep.json"), {"settings": settings, "units": len(units)})
+    for unit in units:
+        if not os.path.exists(os.path.join(directory, "results", unit["id"] + ".json")):
+            write_json(os.path.join(directory, "pending", unit["id"] + ".json"), unit)
+
+def unit_files(directory, sub):
+    return sorted(f for f in os.listdir(os.path.join(directory, sub)) if f.endswith(".json"))
+
+# Current time as the shared filesystem sees it: leases are compared with file mtimes, which
+# the file server sets, so clock skew between nodes does not expire live leases
+def filesystem_now(directory):
+    probe = os.path.join(directory, f".clock.{socket.gethostname()}.{os.getpid()}")
+    with open(probe, "w"):
+        pass
+    now = os.stat(probe).st_mtime
+    os.unlink(probe)
+    return now
+
+# Move claims whose lease has expired back to pending/; returns the reclaimed unit ids
+def reclaim_expired(directory, lease):
+    now = filesystem_now(directory)
+    reclaimed = []
+    for name in unit_files(directory, "claimed"):
+        path = os.path.join(directory, "claimed", name)
+        unit_id = name.split(".")[0]
+        try:
+            if now - os.stat(path).st_mtime > lease:
+                os.rename(path, os.path.join(directory, "pending", unit_id + ".json"))
+                reclaimed.append(unit_id)
+        except FileNotFoundError:
+            pass
+    return reclaimed
+
+# Claim file name of a worker: its name with anything but word characters and dashes
+# replaced, so that the unit id is everything before the first dot
+def owner_tag(name):
+    return re.sub(r"[^\w-]", "-", name)
+
+# Claim one pending unit for `owner`. Workers try the pending units in random order so that
+# they rarely race for the same file; a lost race shows up as FileNotFoundError and the next
+# one is tried.
+def claim(directory, owner):
+    names = unit_files(directory, "pending")
+    random.shuffle(names)
+    for name in names:
+        pending = os.path.join(directory, "pending", name)
+        path = os.path.join(directory, "claimed", f"{name[:-5]}.{owner_tag(owner)}.json")
+        try:
+            os.utime(pending)
+            os.rename(pending, path)
+        except FileNotFoundError:
+            continue
+        # A reclaimed unit may have been finished by its slow original worker after all
+        if os.path.exists(os.path.join(directory, "results", name)):
+            release(path)
+            continue
+        return read_json(path), path
+    return None, None
+
+# Remove a claim. `path` names the owner, so only that worker's claim is removed; if the unit
+# was reclaimed in the meantime the file is gone and nothing happens.
+def release(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+# Touch the claim every `interval` seconds until stopped; stops early if the claim is gone
+def heartbeat(path, interval):
+    stop = threading.Event()
+    def beat():
+        while not stop.wait(interval):
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                return
+    threading.Thread(target=beat, daemon=True).start()
+    return stop
+
+# Generic RY/CNOT-ring ansatz of the ammonia scripts with `layers` entangling layers
+def layered_ansatz(num_qubits, layers):
+    def circuit(params):
+        for i in range(num_qubits):
+            qml.RY(params[i], wires=i)
+        for layer in range(layers):
+            for i in range(num_qubits):
+                qml.CNOT(wires=[i, (i + 1) % num_qubits])
+            for i in range(num_qubits):
+                qml.RY(params[num_qubits + layer * num_qubits + i], wires=i)
+    return circuit
+
+# Energy function and start parameters for one unit, drawn after seeding
+def unit_cost(unit):
+    np.random.seed(unit["seed"])
+    module = load_script(os.path.join(repo_root, unit["script"]))
+    if unit["layers"]:
+        H = getattr(module, hamiltonian_builder(module))()
+        ansatz = layered_ansatz(module.num_qubits, unit["layers"])
+        @qml.qnode(module.dev)
+        def cost(params):
+            ansatz(params)
+            return qml.expval(H)
+        return cost, np.random.random((unit["layers"] + 1) * module.num_qubits)
+    if unit["script"] in drug_target_models:
+        score, args = drug_target_models[unit["script"]][1](module)
+        return (lambda p: score(p, *args[1:])), args[0]
+    return module.circuit, initial_params(module)
+
+def run_unit(unit, settings):
+    start = time.perf_counter()
+    cost, params = unit_cost(unit)
+    _, energy, steps = minimize(cost, params, stepsize=unit["stepsize"], max_steps=settings["max_steps"],
+                                tol=settings["tol"], method=settings["method"])
+    return {"energy": float(energy), "steps": steps, "seconds": time.perf_counter() - start}
+
+# Claim and run units until none are pending or claimed. Dead workers' claims are reclaimed
+# before every claim; while others still hold claims an idle worker keeps polling, so it picks
+# up the units of any worker that dies. Returns the number of units this worker finished.
+def work(directory, lease=600, interval=None, poll=5, name=None, log=True):
+    settings = read_json(os.path.join(directory, "sweep.json"))["settings"]
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    interval = interval or lease / 4
+    finished = 0
+    while True:
+        for unit_id in reclaim_expired(directory, lease):
+            if log:
+                print(f"[{name}] reclaimed {unit_id} from an expired lease", flush=True)
+        unit, path = claim(directory, name)
+        if unit is None:
+            if not unit_files(directory, "claimed") and not unit_files(directory, "pending"):
+                return finished
+            time.sleep(poll)
+            continue
+
+        stop = heartbeat(path, interval)
+        try:
+            row = {**unit, **run_unit(unit, settings)}
+        except Exception:
+            row = {**unit, "error": traceback.format_exc(limit=3).strip()}
+        finally:
+            stop.set()
+        row["worker"] = name
+        write_json(os.path.join(directory, "results", unit["id"] + ".json"), row)
+        release(path)
+        finished += 1
+        if log:
+            outcome = f"energy {row['energy']:.6f} in {row['steps']} steps" if "energy" in row else "failed"
+            print(f"[{name}] {unit['id']} {unit['script']} stepsize={unit['stepsize']} layers={unit['layers']} "
+                  f"seed={unit['seed']}: {outcome}", flush=True)
+
+# Result rows of every finished unit, in unit order
+def merge(directory):
+    return [read_json(os.path.join(directory, "results", name)) for name in unit_files(directory, "results")]
+
+def write_table(rows, path):
+    extra = sorted({k for row in rows for k in row} - set(table_columns))
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=table_columns + extra)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def status(directory):
+    return {sub: len(unit_files(directory, sub)) for sub in ("pending", "claimed", "results")}
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared-filesystem sweep queue for the molecule and drug-target scripts")
+    commands = parser.add_subparsers(dest="command", required=True)
+    init = commands.add_parser("init", help="expand a grid into work units")
+    init.add_argument("directory")
+    init.add_argument("--scripts", default=".", help="regular expression selecting script paths")
+    init.add_argument("--stepsizes", type=float, nargs="+", default=[0.1])
+    init.add_argument("--layers", type=int, nargs="+", default=[0], help="0 keeps the script's own circuit")
+    init.add_argument("--seeds", type=int, nargs="+", default=[0])
+    init.add_argument("--max-steps", type=int, default=200)
+    init.add_argument("--tol", type=float, default=1e-6)
+    init.add_argument("--method", default="adam", choices=("adam",) + scipy_methods)
+    init.add_argument("--max-qubits", type=int, default=12)
+    for command, text in [("work", "claim and run units until the sweep is done"),
+                          ("local", "run several workers on this machine")]:
+        sub = commands.add_parser(command, help=text)
+        sub.add_argument("directory")
+        sub.add_argument("--lease", type=float, default=600, help="seconds before a silent worker's unit is reclaimed")
+        sub.add_argument("--poll", type=float, default=5, help="seconds between checks while others hold units")
+    commands.choices["local"].add_argument("--workers", type=int, default=os.cpu_count())
+    status_parser = commands.add_parser("status", help="count pending, claimed and finished units")
+    status_parser.add_argument("directory")
+    merge_parser = commands.add_parser("merge", help="merge the per-unit results into one table")
+    merge_parser.add_argument("directory")
+    merge_parser.add_argument("--out", help="CSV file (default <directory>/results.csv)")
+    args = parser.parse_args()
+
+    if args.command == "init":
+        models = {**molecule_models(), **{k: v[0] for k, v in drug_target_models.items()}}
+        scripts = [m for m, n in sorted(models.items()) if n <= args.max_qubits and re.search(args.scripts, m)]
+        units = expand_grid(scripts, args.stepsizes, args.layers, args.seeds)
+        init_sweep(args.directory, units, {"max_steps": args.max_steps, "tol": args.tol, "method": args.method})
+        print(f"{len(units)} units over {len(scripts)} scripts written to {args.directory}")
+    elif args.command == "work":
+        finished = work(args.directory, lease=args.lease, poll=args.poll)
+        print(f"Finished {finished} units")
+    elif args.command == "local":
+        # Separate processes, exactly as on separate nodes; each imports pennylane once
+        command = [sys.executable, os.path.abspath(__file__), "work", args.directory,
+                   "--lease", str(args.lease), "--poll", str(args.poll)]
+        workers = [subprocess.Popen(command) for _ in range(args.workers)]
+        sys.exit(max(w.wait() for w in workers))
+    elif args.command == "status":
+        print(", ".join(f"{k}: {v}" for k, v in status(args.directory).items()))
+    else:
+        rows = merge(args.directory)
+        out = args.out or os.path.join(args.directory, "results.csv")
+        write_table(rows, out)
+        print(f"{len(rows)} rows written to {out}")
+        for row in sorted((r for r in rows if "energy" in r), key=lambda r: (r["script"], r["energy"])):
+            print(f"{row['script']:50s} stepsize={row['stepsize']:<6g} layers={row['layers']:<2d} "
+                  f"seed={row['seed']:<3d} energy {row['energy']:.6f} ({row['steps']} steps)")
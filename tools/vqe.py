@@ -0,0 +1,122 @@
+import inspect
+
+import numpy
+import pennylane as qml
+from pennylane import numpy as np
+import scipy.optimize
+
+# Random normalized amplitude vector, as used to start find_ground_state in the molecule scripts
+def random_state(num_qubits):
+    state = np.random.random(2**num_qubits) + 1j * np.random.random(2**num_qubits)
+    return state / np.linalg.norm(state)
+
+# SciPy methods minimize can hand the energy to, in place of Adam. The trust-region Newton
+# methods get Hessian-vector products from finite differences of the exact gradient.
+scipy_methods = ("L-BFGS-B", "BFGS", "CG", "trust-constr", "trust-ncg", "trust-krylov")
+hessp_methods = ("trust-ncg", "trust-krylov")
+
+# Optimization loop shared by the tools and the scripts' method= option. method="adam" is the
+# optimizer of find_ground_state; any of scipy_methods runs SciPy on the QNode energy and its
+# exact autograd gradient instead. Both paths optimize the same objective: complex amplitude
+# parameters are normalized (see real_view), so method="adam" on a StatePrep circuit does not
+# follow the script's own loop, which steps on the unnormalized vector. Both stop early once
+# the energy changes by less than tol between steps (iterations for SciPy). Returns params,
+# final energy and steps taken.
+def minimize(cost, params, stepsize=0.1, max_steps=200, tol=None, log_every=None, method="adam"):
+    if method != "adam":
+        return scipy_minimize(cost, params, method, max_steps, tol, log_every)
+
+    x, unpack = real_view(params)
+    x = np.array(x, requires_grad=True)
+    opt = qml.AdamOptimizer(stepsize=stepsize)
+    previous, steps = None, 0
+    
+    while steps < max_steps:
+        x, energy = opt.step_and_cost(lambda x: cost(unpack(x)), x)
+        steps += 1
+        if log_every and steps % log_every == 0:
+            print(f"Step {steps}: Energy = {energy:.6f}")
+        if tol is not None and previous is not None and abs(energy - previous) < tol:
+            break
+        previous = energy
+    
+    params = unpack(x)
+    return params, cost(params), steps
+
+# The method= option of the scripts' own loops (find_ground_state, vqe_optimize,
+# simulate_drug_repurposing): the run goes through minimize instead. `script_loop` holds the
+# arguments only the script's own loop takes (optimizer, start step, callback, ...); any that
+# are set raise instead of being ignored. Returns params and final energy, like those loops.
+def run_method(cost, params, steps, method, stepsize=0.1, **script_loop):
+    unsupported = [name for name, value in script_loop.items()
+                   if value is not None and not (type(value) is int and value == 0)]
+    if unsupported:
+        raise ValueError(f"{', '.join(unsupported)}: only the script's own loop (method=None) takes these")
+    params, energy, _ = minimize(cost, params, stepsize=stepsize, max_steps=steps, method=method)
+    return params, energy
+
+# Both paths work on real vectors: complex amplitude parameters are split into real and
+# imaginary halves and normalized on the way back. StatePrep does not normalize them, and the
+# energy of an unnormalized vector scales with its squared norm: a line search follows it to
+# minus infinity, and Adam shrinks a positive energy towards zero. Returns the flat start
+# vector and the map back to circuit parameters.
+def real_view(params):
+    shape = qml.math.shape(params)
+    if np.iscomplexobj(params):
+        flat = numpy.ravel(qml.math.to_numpy(params))
+        n = flat.size
+        def unpack(x):
+            z = x[:n] + 1j * x[n:]
+            return np.reshape(z / np.sqrt(np.sum(x ** 2)), shape)
+        return numpy.concatenate([flat.real, flat.imag]), unpack
+    return numpy.ravel(qml.math.to_numpy(params)).astype(float), lambda x: np.reshape(x, shape)
+
+# Energy and exact gradient from one autograd pass, as SciPy's fun(x) -> (f, g) with jac=True
+def value_and_grad(cost, unpack):
+    grad_fn = qml.grad(lambda x: cost(unpack(x)))
+    def fun(x):
+        fun.calls += 1
+        g = grad_fn(np.array(x, requires_grad=True))
+        return float(grad_fn.forward), numpy.asarray(g, dtype=float)
+    fun.calls = 0
+    return fun
+
+def scipy_minimize(cost, params, method, max_steps, tol, log_every):
+    if method not in scipy_methods:
+        raise ValueError(f"Unknown method {method!r}; use 'adam' or one of {scipy_methods}")
+    x0, unpack = real_view(params)
+    # L-BFGS-B takes a step even with maxiter=0
+    if max_steps <= 0:
+        return np.array(unpack(x0), requires_grad=True), cost(unpack(x0)), 0
+    fun = value_and_grad(cost, unpack)
+    history = []
+
+    def callback(intermediate_result):
+        # Trust-region methods report rejected steps with the energy unchanged
+        if history and float(intermediate_result.fun) == history[-1]:
+            return
+        history.append(float(intermediate_result.fun))
+        if log_every and len(history) % log_every == 0:
+            print(f"Step {len(history)}: Energy = {history[-1]:.6f}")
+        if tol is not None and len(history) > 1 and abs(history[-1] - history[-2]) < tol:
+            raise StopIteration
+
+    hessp = None
+    if method in hessp_methods:
+        def hessp(x, p, h=1e-5):
+            step = h / max(numpy.linalg.norm(p), 1e-12)
+            return (fun(x + step * p)[1] - fun(x - step * p)[1]) / (2 * step)
+
+    result = scipy.optimize.minimize(fun, x0, jac=True, hessp=hessp, method=method, callback=callback,
+                                     options={"maxiter": max_steps})
+    if log_every:
+        print(f"{method}: {result.nit} iterations, {fun.calls} energy+gradient evaluations")
+    return np.array(unpack(result.x), requires_grad=True), cost(unpack(result.x)), len(history)
+
+# Cold-start parameters for a molecule script: a random amplitude vector for the
+# StatePrep circuits, one angle per qubit for the rotation-only ones (h2o)
+def initial_params(module):
+    source = inspect.getsource(module.circuit.func)
+    if "StatePrep" in source or "QubitStateVector" in source:
+        return random_state(module.num_qubits)
+    return np.random.random(module.num_qubits)